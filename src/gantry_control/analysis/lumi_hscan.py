@@ -33,21 +33,27 @@ def lumi_hscan(
 
     # Preparing the results regardless
     run_dict = control_cli.saveroot.create_run_dict(session, run_process="lumi_hscan")
-    save_dict = control_cli.saveroot.create_save_dict("lumi", "unc")
+    save_dict = control_cli.saveroot.create_save_dict(
+        "lumi", "unc", capacity=len(control_cli.format.loop_mesh(x, y))
+    )
+    writer = control_cli.saveroot.BackgroundWriter(
+        control_cli.saveroot.RootWriter(rootfile, run_dict)
+    )
 
     # Obtained data over meshgrid
     try:
-        for _x, _y in control_cli.session_iterate(
-            session, control_cli.format.loop_mesh(x, y)
-        ):
-            session.hw.move_to(x=_x, y=_y, z=z)
-            lumi, unc = control_cli.readout.obtain_readout(
-                session, average=True, **kwargs
-            )
-            control_cli.saveroot.update_save_dict(
-                session, save_dict, lumi=lumi, unc=unc
-            )
-            session.update_pbar_data(lumi=f"{lumi:.2f}+-{unc:.2f}")
+        with control_cli.readout.ReadoutContext(session, **kwargs) as readout:
+            readout.plan([(_x, _y, z) for _x, _y in control_cli.format.loop_mesh(x, y)])
+            for _x, _y in control_cli.session_iterate(
+                session, control_cli.format.loop_mesh(x, y)
+            ):
+                readout.move_to(x=_x, y=_y, z=z)
+                lumi, unc = readout.read(average=True)
+                control_cli.saveroot.update_save_dict(
+                    session, save_dict, lumi=lumi, unc=unc
+                )
+                writer.fill(save_dict)
+                session.update_pbar_data(lumi=f"{lumi:.2f}+-{unc:.2f}")
 
         # Running the fit
         p0 = (
@@ -70,10 +76,12 @@ def lumi_hscan(
         run_dict["fit_y"] = fit_val[2], np.sqrt(fit_covar[2][2])
     except Exception as err:
         # Move back to central value before re-raising the error
-        session.hw.move_to(x=np.mean(x), y=np.mean(y), z=z)
+        if not kwargs.get("dry_run"):
+            session.hw.move_to(x=np.mean(x), y=np.mean(y), z=z)
         raise err
     finally:  # Always save the results to what was obtained
-        control_cli.saveroot.save_to_root(rootfile, run_dict, save_dict)
+        control_cli.saveroot.finalize_run_dict(session, run_dict)
+        writer.close(run_dict, save_dict)
 
     return fit_val, fit_covar
 
@@ -178,6 +186,7 @@ if __name__ == "__main__":
         and fit_y[0] > 0
         and fit_y[0] < session.max_y
     ):
-        session.hw.move_to(fit_x[0], fit_y[0], args["scanz"])
+        if not args.get("dry_run"):
+            session.hw.move_to(fit_x[0], fit_y[0], args["scanz"])
     else:
         session.logger.warning("Fit position is out of gantry bounds, not moving")
@@ -21,22 +21,32 @@ def lumi_zscan(session: control_cli.session.Session, **kwargs):
     rootfile = kwargs.get("rootfile")
 
     run_dict = control_cli.saveroot.create_run_dict(session, run_process="lumi_hscan")
-    save_dict = control_cli.saveroot.create_save_dict("lumi", "unc")
+    save_dict = control_cli.saveroot.create_save_dict(
+        "lumi", "unc", capacity=len(control_cli.format.loop_mesh(_z, _p))
+    )
+    writer = control_cli.saveroot.BackgroundWriter(
+        control_cli.saveroot.RootWriter(rootfile, run_dict)
+    )
 
     try:
-        for z, p in session.make_progress_bar(control_cli.format.loop_mesh(_z, _p)):
-            session.hw.move_to(x, y, z)
-            # self.gpio.pwm(0, power, 1e5)  # Maximum PWM frequency
-
-            lumi, unc = control_cli.readout.obtain_readout(
-                session, average=True, **kwargs
-            )
-            control_cli.saveroot.update_save_dict(
-                session, save_dict, lumi=lumi, unc=unc
+        with control_cli.readout.ReadoutContext(session, **kwargs) as readout:
+            readout.plan(
+                [(x, y, z, p) for z, p in control_cli.format.loop_mesh(_z, _p)]
             )
-            session.update_pbar_data(lumi=f"{lumi:.2f}+-{unc:.2f}")
+            for z, p in session.make_progress_bar(control_cli.format.loop_mesh(_z, _p)):
+                readout.move_to(x, y, z)
+                readout.set_pwm(p)
+                # self.gpio.pwm(0, power, 1e5)  # Maximum PWM frequency
+
+                lumi, unc = readout.read(average=True)
+                control_cli.saveroot.update_save_dict(
+                    session, save_dict, lumi=lumi, unc=unc
+                )
+                writer.fill(save_dict)
+                session.update_pbar_data(lumi=f"{lumi:.2f}+-{unc:.2f}")
     finally:  # Always save the results to what was obtained
-        control_cli.saveroot.save_to_root(rootfile, run_dict, save_dict)
+        control_cli.saveroot.finalize_run_dict(session, run_dict)
+        writer.close(run_dict, save_dict)
 
 
 if __name__ == "__main__":
@@ -107,6 +117,7 @@ if __name__ == "__main__":
         and fit_y[0] > 0
         and fit_y[0] < session.max_y
     ):
-        session.hw.move_to(fit_x[0], fit_y[0], args["scanz"])
+        if not args.get("dry_run"):
+            session.hw.move_to(fit_x[0], fit_y[0], args["scanz"])
     else:
         session.logger.warning("Fit position is out of gantry bounds, not moving")
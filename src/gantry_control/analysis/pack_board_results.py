@@ -46,9 +46,13 @@ def pack_board_results(board_file, remove_old=False):
             shutil.copy(res.file, make_new_filename(res.file))
             res.file = make_new_filename(res.file)
 
-    # Writing the modified board results to the directory
+    # Writing the modified board results to the directory, the journal of the
+    # old board file is already included in the loaded board
     old_files.append(board.filename)
+    if os.path.exists(board.journal_filename):
+        old_files.append(board.journal_filename)
     board.save_board(make_new_filename(board.filename))
+    board.flush()  # Board saving is batched, make sure file is written
 
     # Making the tarball
     with tarfile.open(base_dir + ".tar.gz", "w:gz") as tar:
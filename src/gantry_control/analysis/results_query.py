@@ -0,0 +1,202 @@
+"""
+
+results_query.py
+
+Querying the calibration results of all boards in the results store, for
+studies across boards (ex: yield and drift of the alignment results over the
+production). The results of all boards are flattened into an index stored in
+the store directory, which is updated lazily when a query is made: only boards
+whose files changed since the last query are parsed again (in parallel if
+requested). The query results are returned as a columnar table.
+
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import os
+import sqlite3
+from contextlib import closing
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import gantry_control.cli.board as brd
+from gantry_control.cli.catalog import ResultsCatalog
+from gantry_control.cli.format import _timestamp_fmt_, str_to_time, time_to_str
+
+INDEX_NAME = ".results_index.sqlite"
+
+_SCHEMA_ = """
+CREATE TABLE IF NOT EXISTS sources (
+  filename TEXT PRIMARY KEY,
+  stamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+  filename TEXT NOT NULL,
+  board_type TEXT NOT NULL,
+  board_id INTEGER NOT NULL,
+  detid INTEGER NOT NULL,
+  process TEXT NOT NULL,
+  z REAL,
+  fit_x REAL,
+  fit_y REAL,
+  file TEXT NOT NULL,
+  timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_source ON results (filename);
+CREATE INDEX IF NOT EXISTS results_lookup ON results (board_type, process, timestamp);
+"""
+
+# Columns of the returned table, the z/fit_x/fit_y columns are only filled for
+# horizontal alignment results (NaN otherwise)
+RESULT_COLUMNS = np.dtype(
+    [
+        ("board_type", object),
+        ("board_id", np.int64),
+        ("detid", np.int32),
+        ("process", object),
+        ("z", np.float64),
+        ("fit_x", np.float64),
+        ("fit_y", np.float64),
+        ("file", object),
+        ("timestamp", "datetime64[s]"),
+    ]
+)
+
+
+def query_results(
+    board_type: Optional[str] = None,
+    process: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    store: str = brd.DEFAULT_STORE_PATH,
+    processes: int = 1,
+) -> np.ndarray:
+    """
+    Calibration results of all boards in the store matching the board type,
+    process name and time range (all optional), ordered by timestamp. The
+    results are returned as a numpy structured array with the RESULT_COLUMNS
+    columns. The index of the store is updated before the query, parsing boards
+    with changed files using the requested number of worker processes.
+    """
+    with closing(_connect(store)) as conn, conn:
+        _update_index(conn, store, processes)
+
+        query, args = "SELECT * FROM results WHERE 1", []
+        for column, op, value in [
+            ("board_type", "=", board_type),
+            ("process", "=", process),
+            ("timestamp", ">=", since and time_to_str(since)),
+            ("timestamp", "<=", until and time_to_str(until)),
+        ]:
+            if value is not None:
+                query += f" AND {column} {op} ?"
+                args.append(value)
+        rows = conn.execute(query + " ORDER BY timestamp, board_id, detid", args)
+
+        return np.array(
+            [
+                (*row[1:-1], np.datetime64(str_to_time(row[-1]), "s"))
+                for row in rows.fetchall()
+            ],
+            dtype=RESULT_COLUMNS,
+        )
+
+
+def _connect(store: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(os.path.join(store, INDEX_NAME), timeout=10)
+    conn.execute("PRAGMA journal_mode=PERSIST")  # See catalog.ResultsCatalog
+    conn.executescript(_SCHEMA_)
+    return conn
+
+
+def _source_stamp(filename: str) -> str:
+    """
+    Modification stamp of the board, including the journal file that stores the
+    results not yet written to the board file.
+    """
+    board_stat = os.stat(filename)
+    journal = os.path.splitext(filename)[0] + ".journal.jsonl"
+    journal_mtime = os.stat(journal).st_mtime_ns if os.path.exists(journal) else 0
+    return f"{board_stat.st_mtime_ns}:{board_stat.st_size}:{journal_mtime}"
+
+
+def _update_index(conn: sqlite3.Connection, store: str, processes: int) -> None:
+    """Re-indexing boards whose files changed since they were last indexed"""
+    catalog = ResultsCatalog(store)
+    stamps = {
+        os.path.relpath(x, catalog.directory): _source_stamp(x)
+        for x in catalog.board_files()
+    }
+    known = dict(conn.execute("SELECT filename, stamp FROM sources").fetchall())
+
+    for name in set(known) - set(stamps):  # Boards removed from the store
+        conn.execute("DELETE FROM results WHERE filename = ?", (name,))
+        conn.execute("DELETE FROM sources WHERE filename = ?", (name,))
+
+    stale = [x for x in stamps if known.get(x) != stamps[x]]
+    paths = [os.path.join(catalog.directory, x) for x in stale]
+    if processes > 1 and len(stale) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            board_rows = list(pool.map(_index_board, paths))
+    else:
+        board_rows = [_index_board(x) for x in paths]
+
+    for name, rows in zip(stale, board_rows):
+        conn.execute("DELETE FROM results WHERE filename = ?", (name,))
+        conn.executemany(
+            "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(name, *row) for row in rows],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?)", (name, stamps[name])
+        )
+
+
+def _index_board(filename: str) -> List[Tuple]:
+    """Flattening the calibration results of a board file into table rows"""
+    board = brd.Board.from_json(filename)
+    rows = []
+    for detid, det in enumerate(board.detectors):
+        for res in det.calibrated:
+            if isinstance(res, brd.HAlignResult):
+                z, fit_x, fit_y = res.process_z, res.fit_x, res.fit_y
+            else:
+                z, fit_x, fit_y = None, None, None
+            rows.append(
+                (
+                    board.board_type,
+                    board.id_unique,
+                    detid,
+                    res.process,
+                    z,
+                    fit_x,
+                    fit_y,
+                    res.file,
+                    time_to_str(res.timestamp),
+                )
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Querying the calibration results stored for all boards"
+    )
+    parser.add_argument("--board_type", type=str, default=None)
+    parser.add_argument("--process", type=str, default=None)
+    parser.add_argument(
+        "--since", type=str, default=None, help=f"Timestamp [{_timestamp_fmt_}]"
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    table = query_results(
+        board_type=args.board_type,
+        process=args.process,
+        since=str_to_time(args.since) if args.since else None,
+        processes=args.processes,
+    )
+    for row in table:
+        print(*row)
@@ -1,4 +1,15 @@
 # Do nothing for the time being
 
-from . import arguments, board, format, readout, saveroot, session
+from . import (
+    arguments,
+    board,
+    catalog,
+    format,
+    persist,
+    readout,
+    saveroot,
+    serialize,
+    session,
+    stats,
+)
 from .progress_monitor import session_iterate
@@ -5,21 +5,36 @@ _board.py
 Python classes used to handling detector layout and board configurations, to
 keep track of the existing calibration process results.
 """
+import bisect
 import datetime
 import enum
 import json
 import os
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+import threading
+from dataclasses import dataclass, field, fields
+from typing import ClassVar, Dict, List, Optional, Tuple
 
-from .format import (_str_, _timestamp_, _timestamp_fmt_, _value_rounding,
-                     str_to_time, time_to_str)
+import numpy
+
+from . import serialize
+from .catalog import ResultsCatalog
+from .format import _str_, _timestamp_, _value_rounding, str_to_time, time_to_str
+from .persist import DebouncedWriter, atomic_write
+from .stats import StreamingBounds
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../"))
 TEMPLATE_DIR = os.path.join(PROJECT_ROOT, "config_templates/board_layout/")
+TBT_CONFIG_TEMPLATE = os.path.join(
+    PROJECT_ROOT, "config_templates/tbc_yaml/roc_config_ConvGain4.yaml"
+)
 DEFAULT_STORE_PATH = os.path.join(PROJECT_ROOT, "results/")
 
 
+def _in_directory(filename: str, directory: str) -> bool:
+    """Whether the file is stored directly in the directory"""
+    return os.path.dirname(os.path.abspath(filename)) == os.path.abspath(directory)
+
+
 #### TEMPLATE DIRECTORY #####
 def __run_dir_check__():
     if os.path.isdir(TEMPLATE_DIR):
@@ -44,13 +59,14 @@ def __run_dir_check__():
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class CalibratedResult:
     """
     Generated entry for summarizing calibration results, the core results will
     all be stored in the "data" entry. Specialized inheritance classes will be
     used for user-friendly translation of the results. Inheritance should never
-    attempt to extend the data entries.
+    attempt to extend the data entries (inheritance classes should declare
+    empty __slots__ to keep the objects compact).
     """
 
     process: str = ""
@@ -78,8 +94,20 @@ class CalibratedResult:
     def check_data(self):
         pass
 
+    def is_overlap(self, other) -> bool:
+        """Whether the other result should be overridden by this result"""
+        return False
+
+    @property
+    def index_z(self) -> Optional[float]:
+        """Rounded z value used for indexing, None if result is z independent"""
+        return None
+
     def to_json(self):
-        return {**self.__dict__, **dict(timestamp=time_to_str(self.timestamp))}
+        return {
+            **{f.name: getattr(self, f.name) for f in fields(self)},
+            **dict(timestamp=time_to_str(self.timestamp)),
+        }
 
 
 class HAlignResult(CalibratedResult):
@@ -92,6 +120,8 @@ class HAlignResult(CalibratedResult):
     - 4, the uncertainty in the fitted y result
     """
 
+    __slots__ = ()
+
     @property
     def process_z(self):
         return self.data[0]
@@ -112,6 +142,10 @@ class HAlignResult(CalibratedResult):
     def fit_yerr(self):
         return self.data[4]
 
+    @property
+    def index_z(self) -> float:
+        return float(_value_rounding(self.process_z))
+
     def check_data(self):
         assert self.process == "halign"
         # Must contain 5 entries
@@ -139,13 +173,33 @@ _CHANNEL_RANGE_ = {
     ReadoutMode.Tileboard.value: range(0, 72),
 }
 
-
-@dataclass
+# Columns of the columnar detector view, see Board.columnar
+_DETECTOR_COLUMNS_ = numpy.dtype(
+    [
+        ("mode", numpy.int32),
+        ("channel", numpy.int32),
+        ("default_x", numpy.float64),
+        ("default_y", numpy.float64),
+        ("lumi_z", numpy.float64),
+        ("lumi_x", numpy.float64),
+        ("lumi_xerr", numpy.float64),
+        ("lumi_y", numpy.float64),
+        ("lumi_yerr", numpy.float64),
+    ]
+)
+
+
+@dataclass(slots=True)
 class Detector(object):
     """
     A detector element is defined as an object with a specific readout mode, a
     set of default x-y coordinates. And a list of per-device calibrated
     results.
+
+    Lookups of the calibrated results are performed using an index keyed by
+    the process name and the rounded z value, which is maintained as results
+    are added via the _add_calibrated method (the calibrated list should not be
+    modified directly).
     """
 
     # Read out method/channel
@@ -153,6 +207,33 @@ class Detector(object):
     default_coords: Tuple[float, float] = (0, 0)
     calibrated: List[CalibratedResult] = field(default_factory=lambda: [])
 
+    # Index containers, see _rebuild_index
+    _by_process: Dict = field(init=False, repr=False, compare=False)
+    _by_z: Dict = field(init=False, repr=False, compare=False)
+    _z_sorted: Dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        # Results of each process in the order they were added
+        self._by_process: Dict[str, List[CalibratedResult]] = {}
+        # Latest result of each (process, rounded z)
+        self._by_z: Dict[Tuple[str, float], CalibratedResult] = {}
+        # Sorted list of rounded z values for each process
+        self._z_sorted: Dict[str, List[float]] = {}
+        for res in self.calibrated:
+            self._index_result(res)
+
+    def _index_result(self, res: CalibratedResult):
+        self._by_process.setdefault(res.process, []).append(res)
+        z = res.index_z
+        if z is not None:
+            z_list = self._z_sorted.setdefault(res.process, [])
+            if (res.process, z) not in self._by_z:
+                bisect.insort(z_list, z)
+            self._by_z[(res.process, z)] = res
+
     @classmethod
     def from_jsonmap(cls, jsonmap):
         det = Detector(
@@ -171,7 +252,7 @@ class Detector(object):
 
     def to_json(self):
         return {
-            **self.__dict__,
+            **{f.name: getattr(self, f.name) for f in fields(self) if f.init},
             **{"calibrated": [x.to_json() for x in self.calibrated]},
         }
 
@@ -181,16 +262,14 @@ class Detector(object):
         argument can be used to specify a function to order the processes of
         interest.
         """
-        # Getting the latest calibrated result, of a particular process. The
-        # key can be used to specify th
-        process_list = [x for x in self.calibrated if x.process == process]
+        process_list = self._by_process.get(process, [])
 
         if len(process_list) == 0:
             return None
         elif key is None:
             return process_list[-1]
         else:
-            return sorted(process_list, key=key)[0]
+            return min(process_list, key=key)
 
     # Adding the per detector calibration results
     def _add_lumi_result(
@@ -207,25 +286,33 @@ class Detector(object):
             file=file,
             data=[z, fit_x, fit_xerr, fit_y, fit_yerr],
         )
-        self.calibrated = [x for x in self.calibrated if not x.is_overlap(res)]
-        self.calibrated.append(res)
-        return self.calibrated[-1]
+        return self._add_calibrated(res)
+
+    def _add_calibrated(self, res: CalibratedResult) -> CalibratedResult:
+        """Adding a calibrated result, overriding results that overlap with it"""
+        if (res.process, res.index_z) in self._by_z:
+            # Overriding is rare, so simply rebuild the list and the index
+            self.calibrated = [x for x in self.calibrated if not x.is_overlap(res)]
+            self.calibrated.append(res)
+            self._rebuild_index()
+        else:
+            self.calibrated.append(res)
+            self._index_result(res)
+        return res
 
-    def get_lumi_coord(self, z: None):
-        # TODO: properly fix z ordering
+    def get_lumi_coord(self, z: Optional[float] = None):
+        """
+        The horizontal alignment result at the z value, falling back to the
+        latest result if there are no results at the z value.
+        """
+        if z is not None:
+            res = self._by_z.get(("halign", float(_value_rounding(z))))
+            if res is not None:
+                return res
         return self.get_latest_calibrated("halign", key=None)
 
     def has_lumi_overlap(self, z: float) -> bool:
-        return (
-            len(
-                [
-                    x
-                    for x in self.calibrated
-                    if x.process == "halign" and x.is_overlap(z)
-                ]
-            )
-            > 0
-        )
+        return ("halign", float(_value_rounding(z))) in self._by_z
 
     @property
     def mode(self):
@@ -243,8 +330,13 @@ class Detector(object):
         """
         The calibrated process with z value closest to the target z value
         """
-        z_list = [c.process_z for c in self.calibrated if c.process == process]
-        return min(z_list, key=lambda x: abs(float(x) - float(current_z)))
+        z_list = self._z_sorted.get(process, [])
+        if len(z_list) == 0:
+            raise ValueError(f"No results with z values for process {process}")
+        index = bisect.bisect_left(z_list, float(current_z))
+        candidates = z_list[max(index - 1, 0) : index + 1]
+        z = min(candidates, key=lambda x: abs(x - float(current_z)))
+        return self._by_z[(process, z)].process_z
 
 
 @dataclass
@@ -287,8 +379,29 @@ class Board(object):
     - A list of detectors (see the Detector object)
     - A list of conditions (see the Conditions object) calib.
     routines and board conditions.
+
+    Saving of the board is batched: calls to save_board within the save window
+    (in seconds) result in a single atomic write of the board file. Use the
+    flush method to force pending changes to be written.
+
+    New calibration results are not written by rewriting the board file, but
+    are rather appended to a JSON-lines journal file next to the board file.
+    Each journal entry has a sequence number, and the board file stores the
+    sequence number of the latest entry that it includes (journal_seq), so that
+    the journal entries not yet included in the board file are replayed when
+    loading the board. The journal is compacted into the board file once it
+    contains journal_compact entries, as well as every time the board file is
+    written.
+
+    As the board file is written from the timer thread of the writer, methods
+    modifying the board contents should hold the board lock while doing so.
+    The lock should be released before calling save_board, as the writer holds
+    its own lock while writing the board.
     """
 
+    save_window: ClassVar[float] = 2.0
+    journal_compact: ClassVar[int] = 50
+
     filename: str = ""
     board_type: str = ""
     description: str = ""
@@ -297,6 +410,12 @@ class Board(object):
     # This is for the board conditions (ex. pedestal/timing settings... etc)
     board_routines: List[BoardCalib] = field(default_factory=lambda: [])
     conditions: Dict = field(default_factory=lambda: {})
+    journal_seq: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.RLock()
+        self._writer = DebouncedWriter(self._write_board, self.save_window)
+        self._journal_len = 0
 
     def clear(self):
         self.filename = ""
@@ -306,12 +425,14 @@ class Board(object):
         self.detectors = []
         self.board_routines = []
         self.conditions = {}
+        self.journal_seq = 0
 
     @classmethod
     def from_json(cls, json_file):
-        jsonmap = json.load(open(json_file, "r"))
+        jsonmap = serialize.load(json_file)
         b = cls.from_jsonmap(jsonmap)
-        b.filename = os.path.basename(json_file)
+        b.filename = json_file
+        b._replay_journal()
         return b
 
     @classmethod
@@ -373,22 +494,15 @@ class Board(object):
                 raise ValueError(
                     "board id must be specified with the +<board_type>@<board_id> format"
                 )
-            board_files = [
-                os.path.join(DEFAULT_STORE_PATH, x)
-                for x in os.listdir(DEFAULT_STORE_PATH)
-                if x.startswith(board_type) and x.endswith(".json")
-            ]
+            catalog = ResultsCatalog(DEFAULT_STORE_PATH)
             if board_id:  # Additional board type parsing
-                board_files = [
-                    x for x in board_files if f"@{board_id}" in os.path.basename(x)
-                ]
+                board_files = catalog.find_boards(board_type, int(board_id))
                 assert len(board_files) > 0, "No file found"
                 assert len(board_files) < 2, "Multiple files found"
-
-                return Board.from_json(board_files[0])
-                return board
-            else:
-                return cls.auto_resolve_jsonfile(target="+" + target)
+            else:  # Latest saved board of the board type
+                board_files = catalog.find_boards(board_type)
+                assert len(board_files) > 0, "No file found"
+            return Board.from_json(board_files[0])
         else:
             raise ValueError(
                 "Auto resolution must have target either in ++<board_type>@<board_id> or +<board_type>[@board_id]"
@@ -396,14 +510,15 @@ class Board(object):
 
     def to_json(self):
         return {
-            **self.__dict__,
+            # Private attributes (ex: the writer) are not stored
+            **{k: v for k, v in self.__dict__.items() if not k.startswith("_")},
             **dict(
                 detectors=[x.to_json() for x in self.detectors],
                 board_routines=[x.to_json() for x in self.board_routines],
             ),
         }
 
-    def save_board(self, filename: str = ""):
+    def _resolve_filename(self, filename: str = ""):
         if filename != "":
             self.filename = filename
 
@@ -414,37 +529,110 @@ class Board(object):
                 "@".join([self.board_type, str(self.id_unique)]) + ".json",
             )
 
-        with open(self.filename, "w") as f:
-            f.write(json.dumps(self.to_json(), indent=2))
+    def save_board(self, filename: str = ""):
+        self._resolve_filename(filename)
+        self._writer.request()
+
+    def _write_board(self):
+        with self._lock:
+            atomic_write(self.filename, serialize.dumps(self.to_json(), indent=True))
+            if _in_directory(self.filename, DEFAULT_STORE_PATH):
+                ResultsCatalog(DEFAULT_STORE_PATH).add_board(
+                    self.filename, self.board_type, self.id_unique
+                )
+            # All journal entries are now included in the board file
+            if os.path.exists(self.journal_filename):
+                os.remove(self.journal_filename)
+            self._journal_len = 0
+
+    def flush(self):
+        """Writing any pending changes to the board file"""
+        self._writer.flush()
+
+    @property
+    def journal_filename(self) -> str:
+        return os.path.splitext(self.filename)[0] + ".journal.jsonl"
+
+    def _journal_result(self, detid: int, res: CalibratedResult):
+        """
+        Appending a new calibration result to the journal file. The board lock
+        should be held while adding the result and journaling it, so that a
+        board write either includes the result and its journal entry, or none.
+        """
+        self._resolve_filename()
+        self.journal_seq += 1
+        if not os.path.exists(self.filename):
+            # The journal is only replayed on top of an existing board file, so
+            # the board (including the result) is written directly instead
+            self._write_board()
+            return
+        entry = dict(seq=self.journal_seq, detid=detid, result=res.to_json())
+        with open(self.journal_filename, "ab+") as f:
+            # Starting a new line if the last write was interrupted mid-line
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write((serialize.dumps(entry) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_len += 1
+
+    def _replay_journal(self):
+        """
+        Applying the journal entries that are not yet included in the board file.
+        Partially written lines (from interrupted writes) are skipped, entries
+        appended after an interrupted write always start on a new line.
+        """
+        if not os.path.exists(self.journal_filename):
+            return
+        with open(self.journal_filename, "r") as f:
+            for line in f:
+                try:
+                    entry = serialize.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._journal_len += 1
+                if entry["seq"] <= self.journal_seq:
+                    continue
+                self.detectors[entry["detid"]]._add_calibrated(
+                    CalibratedResult.from_jsonmap(entry["result"])
+                )
+                self.journal_seq = entry["seq"]
 
     @property
     def detid_list(self):
         return range(len(self.detectors))
 
     def update_lumi_results(self, detid, *args, **kwargs):
-        self.detectors[detid]._add_lumi_result(*args, **kwargs)
-        self.save_board()
+        with self._lock:
+            res = self.detectors[detid]._add_lumi_result(*args, **kwargs)
+            self._journal_result(detid, res)
+        if self._journal_len >= self.journal_compact:
+            self.save_board()
 
     # Get/Set calibration measures with additional parsing
     def add_vis_coord(self, detid, z, data, filename):
-        self.detectors[detid].coordinates["calibrated"].append(
-            {
-                "command": "visualcenterdet",
-                "z": self.roundz(z),
-                "data": {"coordinates": data, "file": filename},
-            }
-        )
+        with self._lock:
+            self.detectors[detid].coordinates["calibrated"].append(
+                {
+                    "command": "visualcenterdet",
+                    "z": self.roundz(z),
+                    "data": {"coordinates": data, "file": filename},
+                }
+            )
 
         self.save_board()
 
     def add_visM(self, detid, z, data, filename):
-        self.detectors[detid].coordinates["calibrated"].append(
-            {
-                "command": "visualhscan",
-                "z": self.roundz(z),
-                "data": {"transform": data, "file": filename},
-            }
-        )
+        with self._lock:
+            self.detectors[detid].coordinates["calibrated"].append(
+                {
+                    "command": "visualhscan",
+                    "z": self.roundz(z),
+                    "data": {"transform": data, "file": filename},
+                }
+            )
 
         self.save_board()
 
@@ -458,16 +646,37 @@ class Board(object):
         return self.get_latest_entry(detid, "lumi_vis_separation", z)
 
     def add_lumi_vis_separation(self, detid, z, h):
-        self.detectors[detid - 1].coordinates["calibrated"].append(
-            {
-                "command": "lumi_vis_separation",
-                "z": self.roundz(z),
-                "data": {"separation": h},
-            }
-        )
+        with self._lock:
+            self.detectors[detid - 1].coordinates["calibrated"].append(
+                {
+                    "command": "lumi_vis_separation",
+                    "z": self.roundz(z),
+                    "data": {"separation": h},
+                }
+            )
 
         self.save_board()
 
+    def columnar(self, z: Optional[float] = None) -> numpy.ndarray:
+        """
+        Columnar view of the detectors as a numpy structured array (see
+        _DETECTOR_COLUMNS_), with one entry per detector, for board-wide
+        vectorized operations. The lumi_* columns contain the horizontal
+        alignment fit results at the z value (see Detector.get_lumi_coord), and
+        are NaN for detectors without alignment results. The array is generated
+        on each call and is not updated as new results are added.
+        """
+        cols = numpy.empty(len(self.detectors), dtype=_DETECTOR_COLUMNS_)
+        for index, det in enumerate(self.detectors):
+            lumi = det.get_lumi_coord(z)
+            cols[index] = (
+                det.mode,
+                det.channel,
+                *det.default_coords,
+                *(lumi.data if lumi is not None else [numpy.nan] * 5),
+            )
+        return cols
+
     def empty(self):
         for detid in range(0, len(self.detectors)):
             if (
@@ -488,18 +697,30 @@ class Conditions:
     """
     Container class for storing the gantry conditions (used to extrapolate for
     rapid calibration)
+
+    The history of the luminosity/visual separation measurements is kept as
+    running statistics (mean, variance and element-wise bounds), so that
+    updates and tolerance checks do not depend on the length of the history.
+    Each save writes a new timestamped file, use the latest_conditions_filename
+    and conditions_filename_as_of methods to look up the stored conditions.
     """
 
     filename: str = ""
     fov_transformation: Dict = field(default_factory=lambda: {})
     fov_lumi_mismatch: Dict = field(default_factory=lambda: {})
     use_count: int = 0
-    mismatch_history: List = field(default_factory=lambda: [])
+    mismatch_history: StreamingBounds = field(default_factory=StreamingBounds)
 
     @classmethod
     def from_json(cls, filename):
-        cond = Conditions(**json.load(open(filename, "r")))
-        cond.mismatch_history = [cond.fov_lumi_mismatch["data"]["separation"]]
+        jsonmap = serialize.load(filename)
+        history = jsonmap.pop("mismatch_history", None)
+        cond = Conditions(**jsonmap)
+        if history is not None:
+            cond.mismatch_history = StreamingBounds.from_json(history)
+        elif "separation" in cond.fov_lumi_mismatch.get("data", {}):
+            # Files without the history only store the latest separation
+            cond.mismatch_history.add(cond.fov_lumi_mismatch["data"]["separation"])
         return cond
 
     def __dict__(self):
@@ -507,6 +728,7 @@ class Conditions:
             fov_transformation=self.fov_transformation,
             fov_lumi_mismatch=self.fov_lumi_mismatch,
             use_count=self.use_count,
+            mismatch_history=self.mismatch_history.to_json(),
         )
 
     # saves gantry conditions to a file
@@ -516,18 +738,17 @@ class Conditions:
         if self.filename == "":
             self.timestamp_filename()
 
-        with open(self.filename, "w") as f:
-            self.use_count += 1
-            f.write(json.dumps(self.__dict__(), indent=2))
+        self.use_count += 1
+        atomic_write(self.filename, serialize.dumps(self.__dict__(), indent=True))
+        if _in_directory(self.filename, self.save_directory()):
+            ResultsCatalog(self.save_directory()).add_conditions(self.filename)
 
     def is_h_valid(self, h, tolerance):
         """
-        Checks if the h value is within tolerance of the h values in the h_list
+        Checks if the h value is within tolerance of the h values in the
+        mismatch history
         """
-        for h_i in self.mismatch_history:
-            if abs(h_i - h) > tolerance:
-                return False
-        return True
+        return self.mismatch_history.is_within(h, tolerance)
 
     # define get, calculate functions for the data quality(long term)
     # conditions and the board conditions
@@ -568,18 +789,20 @@ class Conditions:
         Returning the string corresponding to the filename for the latest set
         of gantry conditions.
         """
-        file_names = os.listdir(cls.save_directory())
-        # sort the file names by date if the format of the filename is
-        # '%Y%m%d-%H%M'.json
-        if len(file_names) > 0:
-            return sorted(
-                file_names,
-                key=lambda x: datetime.datetime.strptime(
-                    os.path.basename(x), f"{_timestamp_fmt_}.json"
-                ),
-            )[-1]
-        else:
-            return None
+        # Catalog entries are sorted by the timestamp in the file name
+        latest = ResultsCatalog(cls.save_directory()).latest_conditions()
+        return os.path.basename(latest) if latest is not None else None
+
+    @classmethod
+    def conditions_filename_as_of(cls, t: datetime.datetime) -> Optional[str]:
+        """
+        Returning the string corresponding to the filename for the set of
+        gantry conditions that was in use at the given time.
+        """
+        filename = ResultsCatalog(cls.save_directory()).conditions_as_of(
+            time_to_str(t)
+        )
+        return os.path.basename(filename) if filename is not None else None
 
 
 """
@@ -621,10 +844,8 @@ def _update_separation(cond: Conditions, board: Board, detid: int, z: float):
 
     # check if we have multiple H values out of tolerance with each other,
     if cond.is_h_valid(h, 0.5):
-        cond.fov_lumi_mismatch["separation"] = (
-            (cond.fov_lumi_mismatch["separation"] * len(cond.h_list)) + h
-        ) / (len(cond.h_list) + 1)
-        cond.h_list.append(h)
+        cond.mismatch_history.add(h)
+        cond.fov_lumi_mismatch["separation"] = cond.mismatch_history.mean.tolist()
     else:
         # TODO: An error should be raised (?) such that the operator knows that
         # something is wrong (maybe the gantry head dislodged or was tugged
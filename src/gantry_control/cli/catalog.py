@@ -0,0 +1,220 @@
+"""
+catalog.py
+
+SQLite catalog of the board and conditions files stored in a results directory,
+so that resolving the stored files does not require listing and parsing every
+file in the directory. The catalog is updated whenever a file is saved, and is
+synchronized with the directory contents before a lookup if the modification
+time of the directory changed since the last synchronization (ex: files copied
+or removed by hand).
+"""
+
+import datetime
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from typing import List, Optional
+
+from .format import _timestamp_fmt_
+
+CATALOG_NAME = ".catalog.sqlite"
+
+_SCHEMA_ = """
+CREATE TABLE IF NOT EXISTS boards (
+  filename TEXT PRIMARY KEY,
+  board_type TEXT NOT NULL,
+  id_unique INTEGER NOT NULL,
+  saved REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS boards_lookup ON boards (board_type, id_unique);
+CREATE TABLE IF NOT EXISTS conditions (
+  filename TEXT PRIMARY KEY,
+  timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conditions_lookup ON conditions (timestamp);
+CREATE TABLE IF NOT EXISTS sync (
+  directory_mtime INTEGER NOT NULL
+);
+"""
+
+# Default file name format of stored boards: <board_type>@<id_unique>.json
+_board_filename_re_ = re.compile(r"^(.+)@(-?\d+)\.json$")
+
+
+class ResultsCatalog(object):
+    """
+    Catalog of a single results directory. The catalog database is stored in
+    the directory itself, and file names are stored relative to the directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self.filename = os.path.join(self.directory, CATALOG_NAME)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.filename, timeout=10)
+        # Keeping the rollback journal file, as creating and deleting it on
+        # each transaction would modify the directory (see _with_sync)
+        conn.execute("PRAGMA journal_mode=PERSIST")
+        conn.executescript(_SCHEMA_)
+        return conn
+
+    def _execute(self, query: str, *args) -> List[tuple]:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(query, args).fetchall()
+
+    def _relpath(self, filename: str) -> str:
+        return os.path.relpath(os.path.abspath(filename), self.directory)
+
+    def _abspaths(self, rows: List[tuple]) -> List[str]:
+        return [os.path.join(self.directory, x[0]) for x in rows]
+
+    def add_board(self, filename: str, board_type: str, id_unique: int) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO boards VALUES (?, ?, ?, ?)",
+            self._relpath(filename),
+            board_type,
+            int(id_unique),
+            time.time(),
+        )
+
+    def add_conditions(self, filename: str) -> None:
+        timestamp = _conditions_timestamp(filename)
+        if timestamp is not None:
+            self._execute(
+                "INSERT OR REPLACE INTO conditions VALUES (?, ?)",
+                self._relpath(filename),
+                timestamp,
+            )
+
+    def find_boards(self, board_type: str, id_unique: Optional[int] = None):
+        """
+        Full paths of the stored boards of a board type (and ID if specified),
+        ordered with the most recently saved first.
+        """
+
+        def _query():
+            if id_unique is None:
+                query = "SELECT filename FROM boards WHERE board_type = ?"
+                args = (board_type,)
+            else:
+                query = """SELECT filename FROM boards
+                           WHERE board_type = ? AND id_unique = ?"""
+                args = (board_type, int(id_unique))
+            return self._abspaths(self._execute(query + " ORDER BY saved DESC", *args))
+
+        return self._with_sync(_query)
+
+    def board_files(self) -> List[str]:
+        """Full paths of all stored boards"""
+        return self._with_sync(
+            lambda: self._abspaths(
+                self._execute("SELECT filename FROM boards ORDER BY filename")
+            )
+        )
+
+    def latest_conditions(self) -> Optional[str]:
+        """Full path of the conditions file with the latest timestamp"""
+        files = self._with_sync(
+            lambda: self._abspaths(
+                self._execute(
+                    "SELECT filename FROM conditions ORDER BY timestamp DESC LIMIT 1"
+                )
+            )
+        )
+        return files[0] if len(files) else None
+
+    def conditions_as_of(self, timestamp: str) -> Optional[str]:
+        """
+        Full path of the latest conditions file with timestamp (in the
+        _timestamp_fmt_ format) no later than the requested timestamp.
+        """
+        files = self._with_sync(
+            lambda: self._abspaths(
+                self._execute(
+                    """SELECT filename FROM conditions WHERE timestamp <= ?
+                       ORDER BY timestamp DESC LIMIT 1""",
+                    timestamp,
+                )
+            )
+        )
+        return files[0] if len(files) else None
+
+    def _with_sync(self, query) -> List[str]:
+        """
+        Running the query, synchronizing the catalog with the directory first if
+        the directory modification time changed since the last synchronization.
+        Files being added, removed or renamed all update the directory
+        modification time, so this only requires a single stat call.
+        """
+        synced = self._execute("SELECT directory_mtime FROM sync")
+        if not synced or synced[0][0] != os.stat(self.directory).st_mtime_ns:
+            self.sync()
+        return query()
+
+    def sync(self) -> None:
+        """Synchronizing the catalog with the json files in the directory"""
+        with closing(self._connect()) as conn, conn:
+            # Taken before listing, so that changes during the listing are
+            # picked up by the next synchronization
+            conn.execute("DELETE FROM sync")
+            conn.execute(
+                "INSERT INTO sync VALUES (?)", (os.stat(self.directory).st_mtime_ns,)
+            )
+            known = {
+                x[0]
+                for table in ["boards", "conditions"]
+                for x in conn.execute(f"SELECT filename FROM {table}")
+            }
+            for name in known:
+                if not os.path.exists(os.path.join(self.directory, name)):
+                    conn.execute("DELETE FROM boards WHERE filename = ?", (name,))
+                    conn.execute("DELETE FROM conditions WHERE filename = ?", (name,))
+
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                name = os.path.basename(path)
+                if name in known:
+                    continue
+                timestamp = _conditions_timestamp(name)
+                if timestamp is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO conditions VALUES (?, ?)",
+                        (name, timestamp),
+                    )
+                    continue
+                board_id = _board_identity(path)
+                if board_id is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO boards VALUES (?, ?, ?, ?)",
+                        (name, *board_id, os.path.getmtime(path)),
+                    )
+
+
+def _conditions_timestamp(filename: str) -> Optional[str]:
+    """Timestamp of a conditions file, None if not a conditions file name"""
+    try:
+        stem = os.path.basename(filename)[: -len(".json")]
+        datetime.datetime.strptime(stem, _timestamp_fmt_)
+        return stem  # Timestamp format sorts the same way as strings
+    except ValueError:
+        return None
+
+
+def _board_identity(path: str):
+    """
+    The (board_type, id_unique) of a stored board file, either parsed from the
+    default file name, or from the file content. None if not a board file.
+    """
+    match = _board_filename_re_.match(os.path.basename(path))
+    if match:
+        return match.group(1), int(match.group(2))
+    try:
+        with open(path, "r") as f:
+            jsonmap = json.load(f)
+        return jsonmap["board_type"], int(jsonmap["id_unique"])
+    except (ValueError, KeyError, TypeError):
+        return None
@@ -0,0 +1,106 @@
+"""
+persist.py
+
+Helper functions and classes for persisting the session containers to disk.
+Files are written atomically, and frequent updates can be batched into a single
+write using a debounced writer.
+"""
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from typing import Callable
+
+_logger = logging.getLogger(__name__)
+
+
+def atomic_write(filename: str, content: str) -> None:
+    """
+    Writing a string to file atomically. The content is first written to a
+    temporary file in the same directory, which then replaces the target file,
+    so that the target file is never left in a partially written state. The
+    permission of the existing file is kept.
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(
+        dir=dirname, prefix=f".{os.path.basename(filename)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        mode = os.stat(filename).st_mode if os.path.exists(filename) else 0o644
+        os.chmod(tmpname, mode & 0o777)
+        os.replace(tmpname, filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.unlink(tmpname)
+        raise
+
+
+# Writers with potentially pending writes, flushed at interpreter exit
+_writers = weakref.WeakSet()
+
+
+class DebouncedWriter(object):
+    """
+    Batching write requests that arrive within a time window into a single
+    write. The first request starts a timer, and the write function is called
+    once the window has elapsed, so that all requests arriving within the window
+    are handled by a single write. A window of 0 or less writes immediately.
+    Pending writes are flushed at interpreter exit (including exits due to
+    uncaught exceptions), or explicitly using the flush method. Failed writes
+    in the timer thread are logged, and are kept pending for the next flush.
+    Failed writes at interpreter exit are logged without stopping the writes
+    of other writers.
+    """
+
+    def __init__(self, write: Callable[[], None], window: float):
+        self.write = write
+        self.window = window
+        self._lock = threading.RLock()
+        self._timer = None
+        self._dirty = False
+        _writers.add(self)
+
+    def request(self) -> None:
+        with self._lock:
+            self._dirty = True
+            if self.window <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._timer_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Performing the pending write, if any."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self.write()
+                self._dirty = False
+
+    def _timer_flush(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            _logger.exception("Background write failed, keeping write pending")
+
+    @property
+    def pending(self) -> bool:
+        return self._dirty
+
+
+@atexit.register
+def _flush_all() -> None:
+    for writer in list(_writers):
+        try:  # A failed write should not prevent the other writes
+            writer.flush()
+        except Exception:
+            _logger.exception("Pending write failed at exit")
@@ -12,9 +12,11 @@ import time
 
 import numpy
 
-from .board import ReadoutMode
+from .board import _CHANNEL_RANGE_, ReadoutMode
 from .format import _str_
+from .readoutmodel import _pwm_multiplier, make_rng
 from .session import Session
+from .stats import StreamingStats
 
 
 def add_readout_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
@@ -32,8 +34,49 @@ def add_readout_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
         "--samples",
         type=int,
         default=5000,
-        help="""Number of readout samples to take for the luminosity measurement
-             (default=%(default)d)""",
+        help="""Number of readout samples to take for the luminosity measurement.
+             If a target uncertainty is specified, this is the maximum number of
+             samples to take. (default=%(default)d)""",
+    )
+    group.add_argument(
+        "--min_samples",
+        type=int,
+        default=500,
+        help="""Minimum number of readout samples to take if a target uncertainty
+             is specified (default=%(default)d)""",
+    )
+    group.add_argument(
+        "--target_unc",
+        type=float,
+        default=0,
+        help="""Target relative uncertainty of the readout average. Sampling
+             stops once the target is reached, or once the maximum number of
+             samples is collected. Set to 0 to always take the maximum number
+             of samples (default=%(default)g)""",
+    )
+
+    group.add_argument(
+        "--bulk",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="""Request all readout samples in a single call to the hardware
+             interface if supported, rather than one request per sample""",
+    )
+
+    group.add_argument(
+        "--model_seed",
+        type=int,
+        default=None,
+        help="""Random seed used for model readouts. If not specified, model
+             readouts will not be reproducible""",
+    )
+
+    group.add_argument(
+        "--dry_run",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="""Do not move the gantry, and generate the model readouts of the
+             full scan in a single call. Only valid for model readouts""",
     )
 
     group.add_argument(
@@ -72,77 +115,424 @@ def parse_readout_args(
 
 def obtain_readout(session, average=True, **kwargs):
     """
-    @brief Performing a readout routine with the specified arguments.
+    @brief Performing a single readout routine with the specified arguments.
 
-    @details Abstracting the readout method for child classes. The `average`
-    flag will be used to indicate whether the list return value should be the
-    list of readout values of length (args.samples) or be a 2-tuple indicating
-    the avearge and (reduced) standard deviation of the raw list.
-
-    For pausing the system we will be splitting the wait into 0.1 second
-    interval to allow for the system to detect interuption signals to halt the
-    system even during the wait period.
+    @details Short hand for a single readout using the ReadoutContext, see
+    ReadoutContext.read for the details of the return values. When performing
+    readouts over multiple gantry positions, a ReadoutContext instance should be
+    used directly to avoid the overhead of setting up the readout for every
+    position.
     """
-    session.hw.disable_stepper(x=False, y=False, z=True)
-
-    _method_map_ = {
-        ReadoutMode.DRS.value: _read_drs,
-        ReadoutMode.ADC.value: _read_adc,
-        ReadoutMode.Tileboard.value: _read_tileboard,
-        ReadoutMode.Model.value: _read_model,
-    }
+    with ReadoutContext(session, **kwargs) as readout:
+        return readout.read(average=average)
 
-    mode = session.board.detectors[kwargs.get("detid")].mode
 
-    readout_list = _method_map_.get(mode, _read_model)(session, **kwargs)
+class ReadoutContext(object):
+    """
+    @brief Persistent readout context for performing readouts over a scan.
+
+    @details The detector readout method is resolved once on construction. The
+    z stepper motor is kept disabled while performing the readout, and is only
+    re-enabled when the gantry needs to move along the z direction, and when
+    the context exits. For model readouts, each readout uses an independent
+    random number stream keyed by the (board, detector ID, readout index) so
+    that the model readouts are reproducible if a seed is specified.
+    A typical use case would look like:
+
+    ```python
+    with ReadoutContext(session, **kwargs) as readout:
+        readout.plan([(x, y, z) for x, y in positions])  # Optional
+        for x, y in positions:
+            readout.move_to(x=x, y=y, z=z)
+            lumi, unc = readout.read()
+    ```
+
+    The detector ID can be omitted if only the `read_board` method is used. For
+    dry runs, the gantry is not moved and the stepper motors are left
+    untouched, see the `plan` method for generating the readout of the full
+    scan in a single call. The session telemetry then reports the requested
+    position, with NaN monitoring values.
+    """
 
-    session.hw.enable_stepper(x=True, y=True, z=True)
+    def __init__(self, session, **kwargs):
+        self.session = session
+        self.kwargs = kwargs
+        if kwargs.get("detid") is not None:
+            self.det = session.board.detectors[kwargs.get("detid")]
+            self.method = _method_map_.get(self.det.mode, _read_model)
+            self.is_counting = _is_counting(session, **kwargs)
+        else:  # Only the read_board method can be used
+            self.det, self.method, self.is_counting = None, None, True
+        self.rng_key = _model_rng_key(session, kwargs.get("detid"))
+        self.dry_run = kwargs.get("dry_run", False)
+
+        self.coord = None  # Last requested gantry position
+        self.pwm = 1.0  # LED PWM duty cycle, used by the model readout
+        self.n_points = 0  # Number of readouts performed in this context
+        self._z_disabled = False
+        self._planned = None  # Pre-generated model readout
+        self._planned_points = None  # (index, x, y, z, pwm) of planned points
+
+    def __enter__(self):
+        self._disable_z()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.dry_run:
+            self.session.hw.enable_stepper(x=True, y=True, z=True)
+        else:  # Removing the dry run telemetry snapshot
+            self.session.invalidate_telemetry()
+        self._z_disabled = False
+
+    def _disable_z(self):
+        if not self._z_disabled and not self.dry_run:
+            self.session.hw.disable_stepper(x=False, y=False, z=True)
+            self._z_disabled = True
+
+    def move_to(self, x: float, y: float, z: float):
+        """
+        Moving the gantry, the z stepper is only re-enabled if the target z
+        position differs from the previously requested position. For dry runs,
+        only the requested position is recorded.
+        """
+        if self.dry_run:
+            self.coord = (x, y, z)
+            self.session.set_dry_run_telemetry(self.coord)
+            return
+        if self._z_disabled and (self.coord is None or self.coord[2] != z):
+            self.session.hw.enable_stepper(x=False, y=False, z=True)
+            self._z_disabled = False
+        self.session.hw.move_to(x=x, y=y, z=z)
+        self.session.invalidate_telemetry()
+        self.coord = (x, y, z)
+
+    def set_pwm(self, pwm: float):
+        """
+        Setting the LED PWM duty cycle for the following readouts. Only the
+        model readout currently uses the duty cycle, with the same light model
+        for the planned (see `plan`) and the point-by-point readout.
+        """
+        self.pwm = pwm
 
-    if average:
-        if _is_counting(session, **kwargs):
-            return numpy.mean(readout_list), numpy.std(readout_list) / numpy.sqrt(
-                len(readout_list)
+    def plan(self, points):
+        """
+        @brief Declaring the list of positions that will be read out.
+
+        @details For model readouts in dry runs, the readouts of all (x, y, z[,
+        pwm]) points are generated in a single call (see `model_scan_readout`),
+        and subsequent `read` calls return the pre-generated readout in order.
+        Reads beyond the planned points, or at positions other than the planned
+        ones, fall back to the point-by-point readout. Adaptive sampling is not
+        used for the pre-generated readouts. Does nothing otherwise.
+        """
+        if self.dry_run and self.method is _read_model:
+            points = [(*p, 1.0) if len(p) == 3 else tuple(p) for p in points]
+            self._planned = model_scan_readout(
+                self.session, points, start=self.n_points, **self.kwargs
             )
+            self._planned_points = numpy.array(
+                [(self.n_points + i, *p) for i, p in enumerate(points)]
+            )
+
+    def _planned_readout(self):
+        """Pre-generated readout of the current point, None if not planned"""
+        if self._planned is None:
+            return None
+        index = self.n_points - int(self._planned_points[0, 0])
+        if not 0 <= index < len(self._planned):
+            return None
+        if not numpy.allclose(
+            self._planned_points[index], (self.n_points, *self.coord, self.pwm)
+        ):
+            return None
+        return self._planned[index]
+
+    def read(self, average=True):
+        """
+        @brief Performing a readout at the current gantry position.
+
+        @details The `average` flag will be used to indicate whether the return
+        value should be the list of readout values or be a 2-tuple indicating
+        the avearge and (reduced) standard deviation of the raw list.
+
+        If a target relative uncertainty is specified, the readout is collected
+        in chunks, with the statistics being accumulated as the samples arrive,
+        and sampling stops once the standard error of the average reaches the
+        target (bounded by the min_samples and samples arguments). Notice that
+        the stopping condition uses the standard error regardless of the readout
+        type, the returned uncertainty for non-counting readouts is still the
+        standard deviation.
+        """
+        self._disable_z()
+        max_samples = self.kwargs.get("samples")
+        min_samples = min(self.kwargs.get("min_samples", max_samples), max_samples)
+        target_unc = self.kwargs.get("target_unc", 0)
+        kwargs = {
+            **self.kwargs,
+            "channel": self.det.channel,
+            "coord": self.coord,
+            "pwm": self.pwm,
+            "rng": make_rng(
+                self.kwargs.get("model_seed"), *self.rng_key, self.n_points
+            ),
+        }
+
+        stats = StreamingStats()
+        readout_list = []
+        n = min_samples if target_unc else max_samples
+        planned = self._planned_readout()
+        if planned is not None:
+            readout_list.append(planned)
+            stats.extend(planned)
+            n = 0
+        while n > 0:
+            readout = self.method(self.session, **{**kwargs, "samples": n})
+            stats.extend(readout)
+            if not average:
+                readout_list.append(numpy.asarray(readout))
+            n = _next_chunk_size(stats, min_samples, max_samples, target_unc)
+        self.n_points += 1
+
+        if average:
+            if self.is_counting:
+                return stats.mean, stats.sem
+            else:
+                return stats.mean, stats.std
         else:
-            return numpy.mean(readout_list), numpy.std(readout_list)
-    else:
-        return readout_list
+            return numpy.concatenate(readout_list)
+
+    def read_board(self, average=True):
+        """
+        @brief Reading out all tileboard detectors at the current position.
+
+        @details A single tileboard acquisition contains the readout of all
+        channels, so rather than performing an acquisition per detector, the
+        readout of all board detectors with the tileboard readout mode is
+        extracted from a single acquisition. The return value is a dictionary
+        keyed by the detector ID, with the values following the `read` method
+        (adaptive sampling is not used).
+        """
+        self._disable_z()
+        detids, channels = _tileboard_channel_map(self.session.board)
+        readout = _acquire_tileboard(self.session, self.kwargs.get("samples"))
+        readout = readout[:, channels]  # (samples, n_detectors)
+        self.n_points += 1
+
+        if not average:
+            return dict(zip(detids, readout.T))
+        mean = numpy.mean(readout, axis=0)
+        unc = numpy.std(readout, axis=0) / numpy.sqrt(len(readout))
+        return {d: (m, u) for d, m, u in zip(detids, mean, unc)}
+
+
+def obtain_board_readout(session, average=True, **kwargs):
+    """
+    Short hand for a single readout of all tileboard detectors on the board,
+    see ReadoutContext.read_board for the return value.
+    """
+    with ReadoutContext(session, **kwargs) as readout:
+        return readout.read_board(average=average)
 
 
-def _read_adc(session, **kwargs):
+def _tileboard_channel_map(board):
+    """
+    Detector IDs and the corresponding tileboard channels of all detectors with
+    the tileboard readout mode, returned as a pair of numpy arrays.
+    """
+    cols = board.columnar()
+    detids = numpy.flatnonzero(cols["mode"] == ReadoutMode.Tileboard.value)
+    return detids.tolist(), cols["channel"][detids].astype(numpy.int64)
+
+
+def _next_chunk_size(
+    stats: StreamingStats, min_samples: int, max_samples: int, target_unc: float
+) -> int:
+    """
+    Number of additional samples required for the relative standard error of the
+    average to reach the target, estimated from the statistics collected so far.
+    To avoid excessive number of readout calls due to the fluctuation of the
+    estimate, at least a quarter of min_samples will be requested. Returns 0 if
+    sampling should stop.
+    """
+    remain = max_samples - stats.count
+    if not target_unc or remain <= 0:
+        return 0
+    if stats.mean == 0:  # Relative uncertainty is ill-defined, keep sampling
+        return remain
+    needed = (stats.std / (target_unc * abs(stats.mean))) ** 2
+    if needed <= stats.count:
+        return 0
+    return int(min(remain, max(numpy.ceil(needed) - stats.count, min_samples // 4, 1)))
+
+
+## Maximum random delay between ADC samples, used to avoid 60Hz aliasing
+_ADC_MAX_JITTER_ = 1 / 200
+
+
+def _read_adc(session, samples, channel, bulk=True, **kwargs):
     """
     @brief Implementation for reading out the ADC
+
+    @details Samples are separated by a random delay to avoid aliasing with 60Hz
+    pickups. If the ADC interface supports bulk readout, all samples are
+    requested in a single call, with the random delay schedule being handled on
+    the server side, so that the readout is limited by the ADC conversion rate
+    rather than the network round trip. Otherwise we fall back to requesting one
+    sample at a time.
     """
-    val = []
-    for _ in range(samples):
-        val.append(session.hw.monitor_adc.read(channel))
-        ## Sleeping for random time in ADC to avoid 60Hz aliasing
-        time.sleep(1 / 200 * np.random.random())
+    adc = session.hw.monitor_adc
+    if bulk and hasattr(adc, "read_bulk"):
+        return numpy.asarray(
+            adc.read_bulk(channel, samples, _ADC_MAX_JITTER_), dtype=numpy.float64
+        )
+
+    val = numpy.empty(samples, dtype=numpy.float64)
+    for i in range(samples):
+        val[i] = adc.read(channel)
+        time.sleep(_ADC_MAX_JITTER_ * numpy.random.random())
     return val
 
 
-def _read_drs(session, samples, channel, **kwargs):
+def _read_drs(
+    session,
+    samples,
+    channel,
+    intstart=0,
+    intstop=-1,
+    pedstart=0,
+    pedstop=0,
+    bulk=True,
+    **kwargs,
+):
     """
     @brief Implementation for reading out the DRS4
 
-    @details As the DRS 4 will always effectively be in single shot mode, here we
-    will contiously fire the trigger until collections have been completed.
+    @details If the hardware interface supports block waveform capture, the
+    waveforms are collected in a single request and integrated locally.
+    Otherwise, as the DRS 4 will always effectively be in single shot mode, we
+    will contiously fire the trigger until collections have been completed,
+    with the integration performed on the server side.
     """
-    val = []
-    for _ in range(samples):
-        session.hw.drs_startcollect()
-        while not session.hw.drs_is_ready():
-            _fire_trigger(session, n=10, wait=100)
-        x = session.hw.drs_get_waveformsum(
-            args.channel, args.intstart, args.intstop, args.pedstart, args.pedstop
+    if bulk and hasattr(session.hw, "drs_get_waveform_block"):
+        waveforms = obtain_waveforms(session, samples, channel, bulk=True)
+        windows = [(intstart, intstop, pedstart, pedstop)]
+        return integrate_waveforms(waveforms, windows)[:, 0]
+
+    val = numpy.empty(samples, dtype=numpy.float64)
+    for i in range(samples):
+        _wait_drs_collect(session)
+        val[i] = session.hw.drs_get_waveformsum(
+            channel, intstart, intstop, pedstart, pedstop
         )
-        val.append(x)
-
     return val
 
 
+def _wait_drs_collect(session):
+    """Arming the DRS4 and firing the trigger until a waveform is collected"""
+    session.hw.drs_startcollect()
+    while not session.hw.drs_is_ready():
+        _fire_trigger(session, n=10, wait=100)
+
+
+def obtain_waveforms(session, samples, channel, bulk=True) -> numpy.ndarray:
+    """
+    @brief Collecting raw DRS4 waveforms
+
+    @details Returns the waveforms as a (samples, n_slices) array of int16 ADC
+    values. If supported by the hardware interface, the arming and triggering is
+    handled on the server side, and all waveforms are returned in a single
+    request. Otherwise the waveforms are collected one at a time.
+    """
+    if bulk and hasattr(session.hw, "drs_get_waveform_block"):
+        block = session.hw.drs_get_waveform_block(channel, samples)
+        return numpy.asarray(block, dtype=numpy.int16).reshape(samples, -1)
+
+    waveforms = []
+    for _ in range(samples):
+        _wait_drs_collect(session)
+        waveforms.append(session.hw.drs_get_waveform(channel))
+    return numpy.asarray(waveforms, dtype=numpy.int16)
+
+
+def integrate_waveforms(waveforms, windows) -> numpy.ndarray:
+    """
+    @brief Pedestal subtracted waveform sums for multiple integration windows
+
+    @details Each window is given as a (intstart, intstop, pedstart, pedstop)
+    tuple of time slice indices, following the convention of the command line
+    arguments: the integration is performed over time slices [intstart,
+    intstop), with a negative intstop indicating the end of the waveform. The
+    pedestal is the average value over the time slices [pedstart, pedstop), and
+    no pedestal subtraction is performed if the range is empty. The sums for
+    all windows are evaluated from a single cumulative sum of the waveforms.
+    The return value is a (n_waveforms, n_windows) array.
+    """
+    waveforms = numpy.asarray(waveforms)
+    n_slices = waveforms.shape[-1]
+
+    # Prefix sums, so that sum of slices [a,b) is cumsum[b] - cumsum[a]
+    cumsum = numpy.zeros((waveforms.shape[0], n_slices + 1), dtype=numpy.int64)
+    numpy.cumsum(waveforms, axis=-1, dtype=numpy.int64, out=cumsum[:, 1:])
+
+    def _index(x):
+        x = numpy.asarray(x)
+        return numpy.clip(numpy.where(x < 0, n_slices, x), 0, n_slices)
+
+    intstart, intstop, pedstart, pedstop = (
+        _index(x) for x in numpy.asarray(windows, dtype=numpy.int64).reshape(-1, 4).T
+    )
+    intstop = numpy.maximum(intstop, intstart)
+    pedstop = numpy.maximum(pedstop, pedstart)
+
+    intsum = cumsum[:, intstop] - cumsum[:, intstart]
+    pedsum = cumsum[:, pedstop] - cumsum[:, pedstart]
+    pedlen = pedstop - pedstart
+    pedestal = pedsum / numpy.maximum(pedlen, 1)
+
+    return intsum - pedestal * (intstop - intstart)
+
+
+## Number of normal (non-calibration, non-common-mode) channels per chip half
+_TILEBOARD_HALF_CHANNELS_ = 36
+
+
 def _read_tileboard(session, samples, channel, **kwargs):
-    raise NotImplementedError("Simplified readout of tileboard not yet implemented!")
+    """
+    @brief Implementation for reading out a single tileboard channel
+
+    @details Notice that the tileboard acquisition always includes all channels,
+    see ReadoutContext.read_board for reading out all board detectors from a
+    single acquisition.
+    """
+    return _acquire_tileboard(session, samples)[:, channel]
+
+
+def _acquire_tileboard(session, samples) -> numpy.ndarray:
+    """
+    @brief Acquiring the ADC values of all tileboard channels.
+
+    @details The tileboard tester clients stored in the session are used to
+    acquire the requested number of events. The raw channel indices are folded
+    into the board channel index as `channel + 36 * half`, with the calibration
+    and common mode channels being dropped. Returns a (samples, 72) array of ADC
+    values.
+    """
+    from ..tbc import run_daq  # Heavy imports, only load if needed
+
+    if not session.tbt:
+        raise RuntimeError("Tileboard tester clients have not been initialized")
+    arr = run_daq(session.tbt["daq"], session.tbt["cli"], samples)
+
+    half = numpy.asarray(arr["half"])
+    raw_channel = numpy.asarray(arr["_channel"])
+    adc = numpy.asarray(arr["adc"])
+
+    n_channels = len(_CHANNEL_RANGE_[ReadoutMode.Tileboard.value])
+    readout = numpy.full((len(adc), n_channels), numpy.nan)
+    rows, cols = numpy.nonzero(raw_channel < _TILEBOARD_HALF_CHANNELS_)
+    index = raw_channel[rows, cols] + _TILEBOARD_HALF_CHANNELS_ * half[rows, cols]
+    readout[rows, index] = adc[rows, cols]
+    return readout
 
 
 def _fire_trigger(session, n=10, wait=100):
@@ -171,26 +561,74 @@ def _is_counting(session, **kwargs):
         return det.readout[2]
 
 
-def _read_model(session, **kwargs):
+def _model_rng_key(session, detid):
+    """Key for the model readout random number streams"""
+    board = session.board
+    return (f"{board.board_type}@{board.id_unique}", detid)
+
+
+def model_scan_readout(session, points, start=0, **kwargs) -> numpy.ndarray:
+    """
+    @brief Generating the model readout of a full scan in a single call.
+
+    @details The points should be a list of (x, y, z) or (x, y, z, pwm)
+    coordinates, with the PWM duty cycle taken to be 1 if not specified. The
+    same light model as `_read_model` is used. The light model is evaluated
+    for all points at once, and the readout of the i-th point is drawn from the
+    random stream of scan point `start + i` (see `make_rng`), which is the
+    same stream used by `ReadoutContext.read`. The planned and point-by-point
+    readouts with the same seed are therefore identical. Return a (npoints,
+    samples) array of the readout values.
+    """
+    det = session.board.detectors[kwargs.get("detid")]
+    points = numpy.asarray(points, dtype=numpy.float64)
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    pwm = points[:, 3] if points.shape[1] > 3 else numpy.ones_like(x)
+
+    det_x, det_y = det.default_coords
+    r0 = ((x - det_x) ** 2 + (y - det_y) ** 2) ** 0.5
+    power_mult = _pwm_multiplier(pwm)
+    samples = kwargs.get("samples")
+    key = _model_rng_key(session, kwargs.get("detid"))
+    model = _read_sipm_model if _is_counting(session, **kwargs) else _read_diode_model
+
+    readout = numpy.empty((len(points), samples))
+    for i in range(len(points)):
+        rng = make_rng(kwargs.get("model_seed"), *key, start + i)
+        readout[i] = model(r0[i], z[i], samples, power_mult[i], rng=rng)
+    return readout
+
+
+def _read_model(session, rng=None, **kwargs):
     """
     Generating a fake readout from a predefined model. Currently the position is
     hard coded into into a grid of [100,100] -- [400,400]. Notice that even
     channels are set to be SiPM-like, while the odd channels are set to be
-    LED-like.
+    LED-like. The gantry coordinates will be queried if not explicitly given,
+    and the PWM duty cycle is taken to be 1 if not given.
     """
     samples = kwargs.get("samples")
     det = session.board.detectors[kwargs.get("detid")]
 
-    x, y, z = session.hw.get_coord()
+    x, y, z = kwargs.get("coord") or session.hw.get_coord()
 
     # Hard coding the "position" of the dummy inputs
     det_x, det_y = det.default_coords
     r0 = ((x - det_x) ** 2 + (y - det_y) ** 2) ** 0.5
 
+    power_mult = _pwm_multiplier(kwargs.get("pwm", 1.0))
     if _is_counting(session, **kwargs):
-        return _read_sipm_model(r0, z, samples)
+        return _read_sipm_model(r0, z, samples, power_mult, rng=rng)
     else:
-        return _read_diode_model(r0, z, samples)
+        return _read_diode_model(r0, z, samples, power_mult, rng=rng)
+
+
+_method_map_ = {
+    ReadoutMode.DRS.value: _read_drs,
+    ReadoutMode.ADC.value: _read_adc,
+    ReadoutMode.Tileboard.value: _read_tileboard,
+    ReadoutMode.Model.value: _read_model,
+}
 
 
 ## Static variables for generating fake signal
@@ -203,13 +641,19 @@ _MODEL_SIPM_S1_ = 3
 _MODEL_SIPM_DC_FRAC = 0.04
 
 
-def _read_sipm_model(r0: float, z: float, samples: int, power_mult: float = 1.0):
+def _read_sipm_model(r0, z, samples, power_mult=1.0, rng=None):
+    """
+    Simple SiPM-like readout model. The r0, z and power_mult inputs can also be
+    arrays, with the samples being the output shape that they are broadcasted
+    to.
+    """
+    rng = rng if rng is not None else numpy.random.default_rng()
     # Getting average number of photons arriving at SiPM
     npe_avg = 1000000 * power_mult * z / (r0**2 + z**2) ** 1.5
 
     # Generate random number of photons according to average
     # TODO: Add generalized poisson process
-    npe = numpy.random.poisson(npe_avg, size=samples)
+    npe = rng.poisson(npe_avg, size=samples)
 
     # Truncating to no larger than pixel count
     # TODO: Properly model ooccupancy effect
@@ -219,8 +663,8 @@ def _read_sipm_model(r0: float, z: float, samples: int, power_mult: float = 1.0)
     readout = npe * _MODEL_SIPM_GAIN_
 
     # Adding simple Gaussian noise
-    readout = readout + numpy.random.normal(
-        0, scale=(_MODEL_SIPM_S0_**2 + npe * _MODEL_SIPM_S1_**2) ** 2
+    readout = readout + rng.normal(
+        0, scale=(_MODEL_SIPM_S0_**2 + npe * _MODEL_SIPM_S1_**2) ** 0.5
     )
 
     # Adding afterpulsing noise
@@ -232,99 +676,51 @@ def _read_sipm_model(r0: float, z: float, samples: int, power_mult: float = 1.0)
     return readout
 
 
-def _general_poisson(x, mean, lamb):
-    """
-    Calculating the general poisson probability of x events, given the expected
-    poisson mean x and the correlating factor lamb. The x can either be an array of
-    integer or an array of integer of values.
-    """
-    if not isinstance(x, np.ndarray):
-        return _general_poisson(np.array(x, dtype=np.int64), mean, lamb)
-    y = mean + x * lamb
-    ans = np.log(y) * (x - 1) - special.gammaln(x + 1) + np.log(mean)
-    return np.exp(-y + ans)
-
-
-class SiPMModel(object):
-    """
-    Simple class for handling a model readout using a pre-defined model. The only
-    method that will be directly exposed to the be readout should be the readout
-    """
-
-    def __init__(self, **kwargs):
-        """ """
-        self.npix = kwargs.get("npix", 1000)
-        self.gain = kwargs.get("gain", 120)
-        self.lamb = kwargs.get("lamb", 0.03)
-        self.ap_prob = kwargs.get("ap_prob", 0.05)
-        self.sig0 = kwargs.get("sig0", 20)
-        self.sig1 = kwargs.get("sig1", 5)
-        self.beta = kwargs.get("beta", 120)
-        self.eps = kwargs.get("eps", 0.005)
-        self.dcfrac = kwargs.get("dcfrac", 0.04)
-        self.dc_dist = DarkCurrentDistribution(self.gain, self.eps)
-
-    def read_model(self, r0, z, pwm, samples):
-        """
-        Returning a list of readout values as if the SiPM and the lightsource has a
-        r0,z separation, and the pwm is set to some duty cycle.
-        """
-        nfired = self._calc_npixels_fired(r0, z, pwm)
-        nfired = self._make_gp_list(nfired, samples)
-        return self._smear_values(nfired)
-
-    def _calc_npixels_fired(self, r0, z, pwm):
-        """
-        Getting the number of pixels fired
-        """
-        N0 = 500 * self.npix * _pwm_multiplier(pwm)
-        Nraw = N0 * z / (r0**2 + z**2) ** 1.5
-        return self.npix * (1 - np.exp(-Nraw / self.npix))
-
-    def _make_gp_list(self, mean, samples):
-        """
-        Generating a list of numbers of pixels discharged based on the total mean
-        discharges using the generalized poisson function.
-        """
-        width = np.sqrt(mean)
-        k_min = max([min([0, mean - 3 * width]), 0])
-        k_max = mean + 3 * width + 10
-        k_arr = np.arange(k_min, k_max)
-        gp_prob = _general_poisson(k_arr, mean, self.lamb)
-        gp_prob = gp_prob / np.sum(gp_prob)  ## Additional normalization
-        dist = stats.rv_discrete("GeneralizedPoisson", values=(k_arr, gp_prob))
-        return dist.rvs(size=samples)
-
-    def _smear_values(self, gp_list):
-        """
-        Given a list of prompt discharge pixel counts. Calculate the estimated
-        readout value by scaling the discharge count by the gain, and adding random
-        smearing according to discharge.
-        """
-        nevents = len(gp_list)
-        readout = gp_list * self.gain  # Scaling up by gain.
-        smear = np.sqrt(self.sig0**2 + gp_list * self.sig1**2)  # Smearing the peaks
-        smear = np.random.normal(loc=0, scale=smear)
-
-        ## Getting the number of after pulses
-        apcount = np.random.binomial(gp_list.astype(np.int64), self.ap_prob)
-        apval = np.random.exponential(self.beta, size=(nevents, np.max(apcount)))
-        _, index = np.indices((nevents, np.max(apcount)))
-        apval = np.where(apcount[:, np.newaxis] > index, apval, 0)
-        apval = np.sum(apval, axis=-1)  # Reducing of the last index
-
-        # Adding the dark current distributions.
-        dcval = self.dc_dist.rvs(size=nevents)
-        smear = np.sqrt(self.sig0**2 + self.sig1**2)  # Smearing the main peak
-        dcval = dcval + np.random.normal(loc=0, scale=smear, size=nevents)
-        dc = np.random.random(size=nevents)
-        dcval = np.where(dc > self.dcfrac, 0, dcval)
-
-        # Summing everything
-        return readout + apval + dcval
-
-
-def _read_diode_model(r0, z, samples, power_mult=1.0):
+def _read_diode_model(r0, z, samples, power_mult=1.0, rng=None):
+    """Simple diode-like readout model, inputs follow _read_sipm_model"""
+    rng = rng if rng is not None else numpy.random.default_rng()
     N0 = 30000 * 1000 * 120 * power_mult
     mean = N0 * z / (r0**2 + z**2) ** 1.5
-    return numpy.random.normal(loc=mean, scale=60, size=samples)
+    return rng.normal(loc=mean, scale=60, size=samples)
+
+
+## Simple cell for helping with unit testing
+if __name__ == "__main__":
+    import types
+
+    from .readoutmodel import MockADC
+
+    # Bulk and per-sample ADC readout should give consistent statistics
+    session = types.SimpleNamespace(hw=types.SimpleNamespace(monitor_adc=None))
+    for bulk in [True, False]:
+        session.hw.monitor_adc = MockADC(level=1000, latency=0, seed=1)
+        val = _read_adc(session, 200, 0, bulk=bulk)
+        assert val.shape == (200,) and abs(numpy.mean(val) - 1000) < 10
+        print(f"ADC readout (bulk={bulk}):", numpy.mean(val), numpy.std(val))
+
+    # Tileboard readout through the session tileboard tester clients, using
+    # the mock tileboard servers on the local machine
+    import logging
+
+    from ..tbc.mock_server import MockTileboard
+    from .board import TBT_CONFIG_TEMPLATE, Board, Detector
+    from .session import load_blank_session
+
+    session = load_blank_session(logging.getLogger("readout"))
+    session.board = Board(
+        board_type="mock",
+        description="mock tileboard",
+        detectors=[
+            Detector(readout=(ReadoutMode.Tileboard.value, ch), default_coords=(0, 0))
+            for ch in [0, 10, 40]
+        ],
+    )
+    with MockTileboard(rate=1e5):
+        session._init_tbt("127.0.0.1", TBT_CONFIG_TEMPLATE)
+        result = obtain_board_readout(session, samples=100, dry_run=True)
+        summary = session.tbt_request_summary()
+        session.close_tbt()
+    assert sorted(result) == [0, 1, 2]
+    assert summary["daq"]["start"]["count"] == 1
+    print("Tileboard requests:", summary)
+    print("Tileboard readout:", result)
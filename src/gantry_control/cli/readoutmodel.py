@@ -6,13 +6,37 @@
   the some seperation parameters and powering configuration.
 
 """
+import concurrent.futures
+import functools
 import time
+import zlib
+from typing import Optional, Sequence, Tuple
 
 import numpy as np
 from scipy import special, stats
 
 
 ### Helper function and classes
+def make_rng(seed: Optional[int], *key) -> np.random.Generator:
+    """
+    @brief Independent random number stream identified by a key.
+
+    @details The key is typically (board, detector ID, scan point). Integer
+    entries are used as is, while string entries are converted using the CRC32
+    checksum. The key is used as the spawn key of the seed sequence, so that
+    streams of different keys are independent, and the stream of a given key
+    is identical regardless of the order the streams are generated in. The
+    counter-based Philox bit generator is used so that the stream construction
+    is cheap. If the seed is None, fresh entropy is used and the stream is not
+    reproducible.
+    """
+    spawn_key = tuple(
+        zlib.crc32(k.encode()) if isinstance(k, str) else int(k) % 2**32 for k in key
+    )
+    seq = np.random.SeedSequence(seed, spawn_key=spawn_key)
+    return np.random.Generator(np.random.Philox(seq))
+
+
 def _pwm_multiplier(pwm):
     """
     A very simplified models of how the PWM duty cycle should affect the total
@@ -39,10 +63,272 @@ class DarkCurrentDistribution(stats.rv_continuous):
         den = 2 * np.log((gain - eps) / eps)
         return num / den
 
+    def _pdf(self, x):
+        eps = self.a
+        gain = self.a + self.b
+        return gain / (2 * np.log((gain - eps) / eps) * x * (gain - x))
+
+    def _ppf(self, q):
+        """
+        Closed form inverse of the CDF, so that random number generation does not
+        need to fall back to the numerical inversion of the CDF.
+        """
+        eps = self.a
+        gain = self.a + self.b
+        log_ratio = np.log((gain - eps) / eps)
+        return gain / (1 + np.exp(-log_ratio * (2 * q - 1)))
+
+
+def _general_poisson(x, mean, lamb):
+    """
+    Calculating the general poisson probability of x events, given the expected
+    poisson mean x and the correlating factor lamb. The x can either be an array of
+    integer or an array of integer of values.
+    """
+    if not isinstance(x, np.ndarray):
+        return _general_poisson(np.array(x, dtype=np.int64), mean, lamb)
+    y = mean + x * lamb
+    ans = np.log(y) * (x - 1) - special.gammaln(x + 1) + np.log(mean)
+    return np.exp(-y + ans)
+
+
+## Number of significant digits to keep for caching the distribution tables
+_GP_MEAN_DIGITS_ = 4
+
+
+def _quantize_mean(mean: float) -> float:
+    """Rounding the mean to fixed number of significant digits for caching"""
+    return float(f"{mean:.{_GP_MEAN_DIGITS_}g}")
+
+
+@functools.lru_cache(maxsize=256)
+def _general_poisson_table(mean: float, lamb: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Support and normalized cumulative distribution of the generalized poisson
+    distribution, used for inverse-CDF sampling. The support covers 6 standard
+    deviations about the distribution mean of mean/(1-lamb), with the standard
+    deviation being sqrt(mean/(1-lamb)^3). The returned arrays are set to read
+    only, as they are shared by all cached calls.
+    """
+    if mean <= 0:
+        k_arr, cdf = np.zeros(1, dtype=np.int64), np.ones(1)
+    else:
+        center = mean / (1 - lamb)
+        width = np.sqrt(mean / (1 - lamb) ** 3)
+        k_min = int(max(center - 6 * width, 0))
+        k_max = int(center + 6 * width + 10)
+        k_arr = np.arange(k_min, k_max, dtype=np.int64)
+        cdf = np.cumsum(_general_poisson(k_arr, mean, lamb))
+        cdf = cdf / cdf[-1]  ## Additional normalization
+    k_arr.setflags(write=False)
+    cdf.setflags(write=False)
+    return k_arr, cdf
+
+
+class SiPMModel(object):
+    """
+    Simple class for handling a model readout using a pre-defined model. The only
+    method that will be directly exposed to the be readout should be the readout
+    """
+
+    def __init__(self, **kwargs):
+        """ """
+        self.npix = kwargs.get("npix", 1000)
+        self.gain = kwargs.get("gain", 120)
+        self.lamb = kwargs.get("lamb", 0.03)
+        self.ap_prob = kwargs.get("ap_prob", 0.05)
+        self.sig0 = kwargs.get("sig0", 20)
+        self.sig1 = kwargs.get("sig1", 5)
+        self.beta = kwargs.get("beta", 120)
+        self.eps = kwargs.get("eps", 0.005)
+        self.dcfrac = kwargs.get("dcfrac", 0.04)
+        self.dc_dist = DarkCurrentDistribution(self.gain, self.eps)
+
+    def read_model(self, r0, z, pwm, samples, rng=None):
+        """
+        Returning a list of readout values as if the SiPM and the lightsource has a
+        r0,z separation, and the pwm is set to some duty cycle. If no random number
+        generator is given, a generator with fresh entropy is used.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        nfired = self._calc_npixels_fired(r0, z, pwm)
+        nfired = self._make_gp_list(nfired, samples, rng)
+        return self._smear_values(nfired, rng)
+
+    def _calc_npixels_fired(self, r0, z, pwm):
+        """
+        Getting the number of pixels fired
+        """
+        N0 = 500 * self.npix * _pwm_multiplier(pwm)
+        Nraw = N0 * z / (r0**2 + z**2) ** 1.5
+        return self.npix * (1 - np.exp(-Nraw / self.npix))
+
+    def _make_gp_list(self, mean, samples, rng):
+        """
+        Generating a list of numbers of pixels discharged based on the total mean
+        discharges using the generalized poisson function. Sampling is done by
+        inverting the cumulative distribution table, which is cached for the
+        quantized mean value.
+        """
+        k_arr, cdf = _general_poisson_table(_quantize_mean(mean), self.lamb)
+        index = np.searchsorted(cdf, rng.random(size=samples), side="right")
+        return k_arr[np.minimum(index, len(k_arr) - 1)]
+
+    def _smear_values(self, gp_list, rng):
+        """
+        Given a list of prompt discharge pixel counts. Calculate the estimated
+        readout value by scaling the discharge count by the gain, and adding random
+        smearing according to discharge.
+        """
+        nevents = len(gp_list)
+        readout = gp_list * self.gain  # Scaling up by gain.
+        smear = np.sqrt(self.sig0**2 + gp_list * self.sig1**2)  # Smearing the peaks
+        smear = rng.normal(loc=0, scale=smear)
+
+        ## Getting the number of after pulses. The sum of apcount exponential
+        ## random numbers follows a gamma distribution of shape apcount, so the
+        ## afterpulse charge can be generated with a single draw per event (a
+        ## shape of 0 returns 0).
+        apcount = rng.binomial(gp_list.astype(np.int64), self.ap_prob)
+        apval = rng.gamma(apcount, self.beta)
+
+        # Adding the dark current distributions.
+        dcval = self.dc_dist.rvs(size=nevents, random_state=rng)
+        smear = np.sqrt(self.sig0**2 + self.sig1**2)  # Smearing the main peak
+        dcval = dcval + rng.normal(loc=0, scale=smear, size=nevents)
+        dc = rng.random(size=nevents)
+        dcval = np.where(dc > self.dcfrac, 0, dcval)
+
+        # Summing everything
+        return readout + apval + dcval
+
+
+class DiodeModel(object):
+    """
+    Simple model for a non-counting (diode-like) readout, where the readout
+    follows a Gaussian distribution about the expected light intensity.
+    """
+
+    def __init__(self, **kwargs):
+        self.N0 = kwargs.get("N0", 30000 * 1000 * 120)
+        self.sigma = kwargs.get("sigma", 60)
+
+    def read_model(self, r0, z, pwm, samples, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        mean = self.N0 * _pwm_multiplier(pwm) * z / (r0**2 + z**2) ** 1.5
+        return rng.normal(loc=mean, scale=self.sigma, size=samples)
+
+
+def _read_model_point(model, seed, key, samples, index, point):
+    r0, z, pwm = point
+    return model.read_model(r0, z, pwm, samples, rng=make_rng(seed, *key, index))
+
+
+def generate_readouts(
+    model,
+    points: Sequence[Tuple[float, float, float]],
+    samples: int,
+    seed: Optional[int],
+    key: Tuple = (),
+    processes: int = 1,
+) -> np.ndarray:
+    """
+    @brief Generating model readouts for a list of (r0, z, pwm) points.
+
+    @details The readout of the i-th point is generated with the random number
+    stream make_rng(seed, *key, i), so the results are identical regardless of
+    the number of worker processes used. Returns a (npoints, samples) array.
+    """
+    func = functools.partial(_read_model_point, model, seed, key, samples)
+    if processes > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            chunksize = max(len(points) // (4 * processes), 1)
+            readouts = list(
+                pool.map(func, range(len(points)), points, chunksize=chunksize)
+            )
+    else:
+        readouts = [func(i, p) for i, p in enumerate(points)]
+    return np.array(readouts)
+
+
+class MockADC(object):
+    """
+    Stand-in for the monitoring ADC interface of the gantry control client, used
+    for testing the readout routines without the hardware. The ADC reading is a
+    constant level per channel, with a 60Hz pickup and Gaussian noise added.
+    Sample times are tracked using a simulated clock, with consecutive samples
+    separated by the conversion time and the requested random delay. Each call
+    sleeps for `latency` seconds to emulate the network round trip.
+    """
+
+    def __init__(
+        self, level=1000, pickup=20, noise=5, rate=860, latency=1e-3, seed=None
+    ):
+        self.level = level
+        self.pickup = pickup
+        self.noise = noise
+        self.rate = rate
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+        self._clock = 0.0
+
+    def _sample(self, channel, delays):
+        t = self._clock + np.cumsum(1 / self.rate + delays)
+        self._clock = t[-1]
+        return (
+            self.level * (channel + 1)
+            + self.pickup * np.sin(2 * np.pi * 60 * t)
+            + self.rng.normal(0, self.noise, size=len(t))
+        )
+
+    def read(self, channel):
+        """Single ADC reading"""
+        time.sleep(self.latency)
+        return float(self._sample(channel, np.zeros(1))[0])
+
+    def read_bulk(self, channel, samples, max_jitter):
+        """
+        Multiple ADC readings, with a random delay of up to max_jitter seconds
+        between samples. Returns a numpy array of length samples.
+        """
+        time.sleep(self.latency)
+        return self._sample(channel, max_jitter * self.rng.random(samples))
+
 
 ## Simple cell for helping with unit testing
 if __name__ == "__main__":
     s = SiPMModel()
     print(s.read_model(0, 10, 0.5, 100))
+    start = time.time()
+    for r0 in np.linspace(0, 20, 200):
+        s.read_model(r0, 10, 0.5, 1000)
+    print(f"SiPM model, 200 points: {time.time()-start:.3f}s")
     d = DiodeModel()
     print(d.read_model(0, 10, 0.5, 100))
+
+    # Parallel generation should be identical to the sequential generation
+    points = [(r0, 10, 0.5) for r0 in np.linspace(0, 20, 200)]
+    start = time.time()
+    seq = generate_readouts(s, points, 1000, seed=1, key=("board", 0))
+    print(f"Sequential: {time.time()-start:.3f}s")
+    start = time.time()
+    par = generate_readouts(s, points, 1000, seed=1, key=("board", 0), processes=4)
+    print(f"Parallel: {time.time()-start:.3f}s", np.array_equal(seq, par))
+
+    # Comparing the closed form inverse CDF with the generic numerical inversion
+    dc = DarkCurrentDistribution(120, 0.005)
+    start = time.time()
+    dc.rvs(size=1000000)
+    print(f"Dark current, 1e6 samples: {time.time()-start:.3f}s")
+    start = time.time()
+    stats.rv_continuous._ppf(dc, np.random.random(size=1000))
+    print(f"Dark current, numerical inversion 1e3 samples: {time.time()-start:.3f}s")
+
+    # Comparing single and bulk readout of the mock ADC interface
+    adc = MockADC(seed=1)
+    start = time.time()
+    single = [adc.read(0) for _ in range(1000)]
+    print(f"Single: {time.time()-start:.3f}s", np.mean(single), np.std(single))
+    start = time.time()
+    bulk = adc.read_bulk(0, 1000, 1 / 200)
+    print(f"Bulk: {time.time()-start:.3f}s", np.mean(bulk), np.std(bulk))
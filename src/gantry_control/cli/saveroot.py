@@ -22,8 +22,11 @@ create dictionary and update the entries to contain the standard methods.
 from .session import Session
 from .format import _timestamp_
 
-from typing import Dict, List, Iterable
+from typing import Callable, Dict, Iterable, Optional
 import argparse
+import collections.abc
+import queue
+import threading
 import uproot
 import numpy
 import string
@@ -61,6 +64,20 @@ def create_run_dict(session: Session, **kwargs):
     }
 
 
+def finalize_run_dict(session: Session, run_dict: Dict) -> Dict:
+    """
+    Adding the information that is only available at the end of the run to the
+    run dictionary. Currently this is the request latency summary of the
+    tileboard tester clients, flattened to `zmq_<client>_<command>_<stat>`
+    entries.
+    """
+    for client, commands in session.tbt_request_summary().items():
+        for command, stats in commands.items():
+            for stat, value in stats.items():
+                run_dict[f"zmq_{client}_{command}_{stat}"] = float(value)
+    return run_dict
+
+
 def save_run_dict(
     f: uproot.writing.writable.WritableDirectory,
     run_dict: Dict,
@@ -69,54 +86,273 @@ def save_run_dict(
     pass
 
 
-def create_save_dict(*args):
-    return {
-        "led_lv": [],
-        "led_hv": [],
-        "led_temp": [],
-        "det_temp": [],
-        "det_hv": [],
-        "gantry_coord": [],
-        **{x: [] for x in args},
-    }
+class ScanBuffer(collections.abc.Mapping):
+    """
+    Columnar storage of the per-point scan results. Each field has a fixed
+    numpy dtype (and per-entry shape, ex: 3-vectors for coordinates), and the
+    storage of all fields is preallocated and grown geometrically as entries
+    are appended. Looking up a field returns the contiguous array of the
+    entries filled so far (a view of the storage, not a copy), so the buffer can
+    be passed directly wherever the dictionary of lists was used. As with a
+    dictionary, len() is the number of fields, see `size` for the number of
+    entries.
+    """
+
+    def __init__(self, fields: Dict[str, numpy.dtype], capacity: int = 64):
+        self.size = 0
+        self._columns = {
+            k: numpy.empty(
+                (max(capacity, 1),) + numpy.dtype(v).shape, numpy.dtype(v).base
+            )
+            for k, v in fields.items()
+        }
+
+    def reserve(self, capacity: int) -> None:
+        """Making sure the storage can hold at least `capacity` entries"""
+        for k, column in self._columns.items():
+            if len(column) < capacity:
+                new_column = numpy.empty((capacity,) + column.shape[1:], column.dtype)
+                new_column[: self.size] = column[: self.size]
+                self._columns[k] = new_column
+
+    def append(self, **values) -> None:
+        """Appending a single entry, all fields must be given"""
+        if values.keys() != self._columns.keys():
+            raise KeyError(f"Fields mismatch: {set(values) ^ set(self._columns)}")
+        if self.size == len(next(iter(self._columns.values()))):
+            self.reserve(2 * self.size)
+        for k, v in values.items():
+            self._columns[k][self.size] = v
+        self.size += 1
+
+    def __getitem__(self, key: str) -> numpy.ndarray:
+        return self._columns[key][: self.size]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+
+# Fields and dtypes of the standard monitoring entries
+_SAVE_FIELDS_ = {
+    "led_lv": numpy.float64,
+    "led_hv": numpy.float64,
+    "led_temp": numpy.float64,
+    "det_temp": numpy.float64,
+    "det_hv": numpy.float64,
+    "gantry_coord": (numpy.float64, (3,)),
+}
 
 
-def update_save_dict(session, save_dict: Dict[str, List], **kwargs) -> Dict[str, List]:
-    """Update the standard dictionary"""
-    save_dict["led_lv"].append(session.hw.get_ledlv())
-    save_dict["led_hv"].append(session.hw.get_ledhv())
-    save_dict["led_temp"].append(session.hw.get_ledtemp())
-    save_dict["det_temp"].append(session.hw.get_dettemp())
-    save_dict["det_hv"].append(session.hw.get_dethv())
-    save_dict["gantry_coord"].append(session.hw.get_coord())
-    for key, values in kwargs.items():
-        save_dict[key].append(values)
+def create_save_dict(*args, capacity: int = 64, **kwargs) -> ScanBuffer:
+    """
+    Creating the buffer for the per-point results, containing the standard
+    monitoring entries. Additional fields are float64 if given as arguments, or
+    the specified dtype if given as keyword arguments. The capacity should be
+    set to the planned number of scan points if known.
+    """
+    return ScanBuffer(
+        {**_SAVE_FIELDS_, **{x: numpy.float64 for x in args}, **kwargs},
+        capacity=capacity,
+    )
+
+
+def update_save_dict(session, save_dict: ScanBuffer, **kwargs) -> ScanBuffer:
+    """
+    Update the standard dictionary, the monitoring values are taken from the
+    session telemetry snapshot.
+    """
+    snapshot = session.telemetry()
+    save_dict.append(
+        led_lv=snapshot.led_lv,
+        led_hv=snapshot.led_hv,
+        led_temp=snapshot.led_temp,
+        det_temp=snapshot.det_temp,
+        det_hv=snapshot.det_hv,
+        gantry_coord=snapshot.gantry_coord,
+        **kwargs,
+    )
     return save_dict
 
 
-def save_to_root(
-    file_name: str,
-    run_dict: Dict,
-    save_dict: Dict[str, Iterable],
-    run_tree: str = "runinfo",
-    save_tree: str = "results",
-):
+def _run_dict_value_cast(v):
     """
     The `run_dict` every instance in the run_dict will need to be wrapped as a
     single length array. Additional handling will need to done for "string"
     entries as uproot supports string arrays (Corresponding read-back is handled
     in the `read_root` function)
     """
+    if isinstance(v, str):
+        return [numpy.array(list(v)).view(numpy.int8)]
+    else:
+        return [v]
+
+
+class RootWriter(object):
+    """
+    Writing the results to a ROOT file as the scan progresses. The file is
+    opened and the run tree is written when the writer is created. New entries
+    of the save dictionary are appended to the results tree every `chunk_size`
+    entries (see `fill`), and the run tree is rewritten with the final run
+    information when the writer is closed. The entries already written are kept
+    in the file if the scan is interrupted, and only the unwritten entries need
+    to be kept in memory by the writer.
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        run_dict: Dict,
+        chunk_size: int = 100,
+        run_tree: str = "runinfo",
+        save_tree: str = "results",
+    ):
+        self.file = uproot.recreate(file_name)
+        self.chunk_size = chunk_size
+        self.run_tree = run_tree
+        self.save_tree = save_tree
+        self.n_written = 0  # Number of entries written to the results tree
+        self._write_run(run_dict)
+
+    def _write_run(self, run_dict: Dict) -> None:
+        if self.run_tree in self.file:
+            del self.file[self.run_tree]
+        self._write_tree(
+            self.run_tree,
+            {k: numpy.asarray(_run_dict_value_cast(v)) for k, v in run_dict.items()},
+        )
+
+    def fill(self, save_dict: Dict[str, Iterable], force: bool = False) -> None:
+        """
+        Appending the entries of the save dictionary that have not been written
+        yet, if there are at least `chunk_size` of them (or any if forced).
+        """
+        entries = self._take_entries(save_dict, force)
+        if entries is not None:
+            self._write_entries(entries)
 
-    def _run_dict_value_cast(v):
-        if isinstance(v, str):
-            return [numpy.array(list(v)).view(numpy.int8)]
+    def _take_entries(self, save_dict: Dict[str, Iterable], force: bool = False):
+        """
+        The entries to be written by the fill method (None if there is nothing
+        to write), marking them as written. When forced, the results tree is
+        created even if there are no entries.
+        """
+        n_entries = min(len(v) for v in save_dict.values())
+        if force:
+            n_min = 1 if self.n_written > 0 else 0
         else:
-            return [v]
+            n_min = self.chunk_size
+        if n_entries - self.n_written < n_min:
+            return None
+        entries = {
+            k: numpy.asarray(v[self.n_written : n_entries])
+            for k, v in save_dict.items()
+        }
+        self.n_written = n_entries
+        return entries
+
+    def _write_entries(self, entries: Dict[str, numpy.ndarray]) -> None:
+        if self.save_tree in self.file:
+            self.file[self.save_tree].extend(entries)
+        else:  # Branch types are determined by the first set of entries
+            self._write_tree(self.save_tree, entries)
+
+    def _write_tree(self, name: str, entries: Dict[str, numpy.ndarray]) -> None:
+        """Creating a TTree with fixed shape branches for the entries"""
+        self.file.mktree(
+            name, {k: numpy.dtype((v.dtype, v.shape[1:])) for k, v in entries.items()}
+        )
+        self.file[name].extend(entries)
+
+    def close(self, run_dict: Optional[Dict] = None, save_dict=None) -> None:
+        """
+        Writing the remaining entries of the save dictionary and the final run
+        information (if given) before closing the file.
+        """
+        if save_dict is not None:
+            self.fill(save_dict, force=True)
+        if run_dict is not None:
+            self._write_run(run_dict)
+        self.file.close()
+
+
+class BackgroundWriter(object):
+    """
+    Running the file operations of a RootWriter in a background thread, so that
+    the scan loop does not wait on the disk. The entries to be written are
+    determined in the calling thread (see RootWriter.fill), and the writes are
+    passed to the writer thread through a bounded queue: fill only blocks if
+    `maxsize` writes are still pending, which bounds the memory used when the
+    disk is slower than the scan. Errors in the writer thread are raised on the
+    next fill/flush/close call, and subsequent writes are skipped.
+    """
 
-    with uproot.recreate(file_name) as f:
-        f[run_tree] = {k: _run_dict_value_cast(v) for k, v in run_dict.items()}
-        f[save_tree] = save_dict
+    def __init__(self, writer: RootWriter, maxsize: int = 16):
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                if self._error is None:
+                    func, args = task
+                    func(*args)
+            except BaseException as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _submit(self, func: Callable, *args) -> None:
+        self._raise_error()
+        self._queue.put((func, args))
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def fill(self, save_dict: Dict[str, Iterable], force: bool = False) -> None:
+        """Queuing the write of the unwritten entries, see RootWriter.fill"""
+        entries = self.writer._take_entries(save_dict, force)
+        if entries is not None:
+            self._submit(self.writer._write_entries, entries)
+
+    def flush(self) -> None:
+        """Waiting for all queued writes to be completed"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self, run_dict: Optional[Dict] = None, save_dict=None) -> None:
+        """Queuing the remaining writes and waiting for the file to be closed"""
+        if not self._thread.is_alive():
+            return
+        try:
+            if save_dict is not None:
+                self.fill(save_dict, force=True)
+            self._submit(self.writer.close, run_dict)
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+def save_to_root(
+    file_name: str,
+    run_dict: Dict,
+    save_dict: Dict[str, Iterable],
+    run_tree: str = "runinfo",
+    save_tree: str = "results",
+):
+    """Writing the run and save dictionaries to file in a single call"""
+    writer = RootWriter(file_name, run_dict, run_tree=run_tree, save_tree=save_tree)
+    writer.close(save_dict=save_dict)
 
 
 def read_root(filename: str, run_tree: str = "runinfo", save_tree: str = "results"):
@@ -132,7 +368,7 @@ def read_root(filename: str, run_tree: str = "runinfo", save_tree: str = "result
             return v
 
     with uproot.open(filename) as f:
-        run_arr = f[run_tree].array(library="np")
+        run_arr = f[run_tree].arrays(library="np")
         run_dict = {k: _run_dict_cast_array(v) for k, v in run_arr.items()}
         save_dict = f[save_tree]
 
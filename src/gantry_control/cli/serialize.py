@@ -0,0 +1,159 @@
+"""
+serialize.py
+
+JSON serialization of the session containers (boards, conditions) and of the
+payloads sent to the GUI clients. orjson is used when available, falling back
+to the standard library json module otherwise. Both paths produce the same
+JSON structure (only the formatting of floating point numbers may differ), and
+both natively encode dataclasses (using their to_json method if available),
+numpy scalars/arrays, enums and datetime objects.
+
+The functions follow the standard library signatures, so that this module can
+be used directly as the json module of other libraries (ex: SocketIO).
+"""
+
+import dataclasses
+import datetime
+import enum
+import json
+import math
+from typing import Any, Union
+
+import numpy
+
+from .format import time_to_str
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Casting objects not natively supported by the JSON encoders"""
+    if hasattr(obj, "to_json"):
+        return obj.to_json()
+    if dataclasses.is_dataclass(obj):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    if isinstance(obj, (numpy.generic, numpy.ndarray)):
+        return obj.tolist()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, datetime.datetime):
+        return time_to_str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _has_nonfinite(obj: Any) -> bool:
+    """
+    Whether the object contains non-finite floats (NaN/Infinity), following the
+    same casting as the JSON encoders (see _default).
+    """
+    if isinstance(obj, float):  # Including numpy.float64
+        return not math.isfinite(obj)
+    if obj is None or isinstance(obj, (str, int)):
+        return False
+    if isinstance(obj, dict):
+        return any(_has_nonfinite(x) for x in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_nonfinite(x) for x in obj)
+    if isinstance(obj, numpy.ndarray) and obj.dtype.kind in "fc":
+        return not numpy.isfinite(obj).all()
+    try:
+        return _has_nonfinite(_default(obj))
+    except TypeError:
+        return False
+
+
+if orjson is not None:
+    _orjson_opts_ = (
+        orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_NON_STR_KEYS
+    )
+
+
+def dumps(obj: Any, indent: bool = False, **kwargs) -> str:
+    """
+    Encoding an object as a JSON string, indented with 2 spaces if requested.
+    Additional keyword arguments (ex: the separators used by the standard
+    library) are accepted for compatibility, but ignored.
+    """
+    if orjson is not None:
+        opts = _orjson_opts_ | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            out = orjson.dumps(obj, default=_default, option=opts)
+        except orjson.JSONEncodeError:
+            out = None  # Ex: integers larger than 64 bits
+        # orjson writes non-finite floats as null, these are rare, so the
+        # standard library is used to keep NaN/Infinity if any are present.
+        # Objects are only scanned if the output contains a null at all.
+        if out is not None and (b"null" not in out or not _has_nonfinite(obj)):
+            return out.decode()
+    return json.dumps(
+        obj,
+        indent=2 if indent else None,
+        separators=(",", ": ") if indent else (",", ":"),
+        ensure_ascii=False,
+        default=_default,
+    )
+
+
+def loads(s: Union[str, bytes], **kwargs) -> Any:
+    """Decoding a JSON string, keyword arguments are accepted but ignored."""
+    if orjson is not None:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            pass  # Ex: NaN/Infinity literals written by the standard library
+    return json.loads(s)
+
+
+def load(filename: str) -> Any:
+    """Decoding the content of a JSON file"""
+    with open(filename, "rb") as f:
+        return loads(f.read())
+
+
+## Simple cell for helping with unit testing
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import timeit
+
+    from .board import Board, CalibratedResult, Detector, HAlignResult
+
+    # 72-detector board with long calibration histories
+    board = Board(board_type="benchmark", description="benchmark", id_unique=0)
+    for detid in range(72):
+        det = Detector(readout=(2, detid), default_coords=(detid * 10.0, 5.0))
+        for index in range(200):
+            det._add_calibrated(
+                HAlignResult("halign", f"run{index}.txt", data=[index, 1, 0.1, 2, 0.2])
+            )
+            det._add_calibrated(CalibratedResult("dark", f"d{index}.txt", data=[1e-5]))
+        board.detectors.append(det)
+    jsonmap = board.to_json()
+    assert json.loads(dumps(jsonmap, indent=True)) == json.loads(
+        json.dumps(jsonmap, indent=2)
+    )
+
+    # Non-finite floats are kept, null values and "null" strings are not
+    # mistaken for them
+    for obj in [{"a": None, "b": "null"}, [1.0, numpy.nan], numpy.array([numpy.inf])]:
+        out = dumps(obj)
+        assert ("NaN" in out or "Infinity" in out) == _has_nonfinite(obj), out
+    assert math.isnan(loads(dumps({"a": float("nan")}))["a"])
+
+    filename = os.path.join(tempfile.mkdtemp(), "benchmark@0.json")
+    with open(filename, "w") as f:
+        f.write(dumps(jsonmap, indent=True))
+    print(f"orjson available: {orjson is not None}")
+    for name, stmt in [
+        ("stdlib save", lambda: json.dumps(board.to_json(), indent=2)),
+        ("serialize save", lambda: dumps(board.to_json(), indent=True)),
+        ("stdlib load", lambda: Board.from_jsonmap(json.load(open(filename)))),
+        ("serialize load", lambda: Board.from_jsonmap(load(filename))),
+    ]:
+        print(f"{name:>16s}: {min(timeit.repeat(stmt, number=5, repeat=3))/5:.4f}s")
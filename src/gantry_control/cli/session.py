@@ -7,17 +7,34 @@ system)
 import argparse
 import json
 import logging
+import math
 import os
 import time
 from dataclasses import dataclass, field
-from typing import Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import gmqclient
 
-from .board import Board, Conditions
+from .board import TBT_CONFIG_TEMPLATE, Board, Conditions
 from .format import _str_, str_to_time
 
 
+@dataclass
+class TelemetrySnapshot(object):
+    """
+    Monitoring values of the gantry system fetched at a single time (the
+    timestamp is the time.monotonic value at the fetch).
+    """
+
+    timestamp: float
+    led_lv: float
+    led_hv: float
+    led_temp: float
+    det_temp: float
+    det_hv: float
+    gantry_coord: Tuple[float, float, float]
+
+
 @dataclass
 class Session(object):
     # Main attribues to for handling the session
@@ -25,12 +42,18 @@ class Session(object):
     logger: logging.Logger
     board: Optional[Board]
     conditions: Optional[Conditions]
+    # Tileboard tester clients, keyed by the client name ("daq", "cli", "i2c")
+    tbt: Optional[Dict[str, Any]] = None
 
     # Addtional variable for that is required
     max_x: int = 350
     max_y: int = 350
     max_z: int = 350
 
+    # Maximum age (in seconds) of the cached telemetry snapshot, see telemetry
+    telemetry_max_age: float = 1.0
+    _telemetry: Optional[TelemetrySnapshot] = None
+
     # Addtional methods to handle progress monitoring. Mainly required for the
     # GUI session. The cli-session will likely keep this method blank. Function
     # signature should be (Session, tqdm object)
@@ -46,8 +69,12 @@ class Session(object):
             self.init_from_json(kwargs.get("session_json"))
             return
         # Individual parsing
+        if kwargs.get("telemetry_max_age") is not None:
+            self.telemetry_max_age = kwargs["telemetry_max_age"]
         assert kwargs["hw_connection"], "Required to establish gantry control client"
         self._init_hw(kwargs["hw_connection"])
+        if kwargs.get("tbt_connection"):
+            self._init_tbt(kwargs["tbt_connection"], kwargs["tbt_config"])
         self._init_conditions(kwargs["conditions"])
         assert kwargs[
             "board"
@@ -67,10 +94,32 @@ class Session(object):
 
         # Additional methods defined below
         setattr(type(self.hw), "get_ledlv", _get_ledlv)
-        setattr(type(self.hw), "get_ledhv", _get_ledlv)
+        setattr(type(self.hw), "get_ledhv", _get_ledhv)
         setattr(type(self.hw), "get_ledtemp", _get_ledtemp)
         setattr(type(self.hw), "get_dettemp", _get_dettemp)
         setattr(type(self.hw), "get_dethv", _get_dethv)
+        setattr(type(self.hw), "get_telemetry", _get_telemetry)
+
+    def _init_tbt(self, tbt_connection: str, tbt_config: str) -> None:
+        """
+        Setting up the tileboard tester clients. The connection string should
+        be in the format '<host>[:<daq_port>:<cli_port>:<i2c_port>]', with the
+        data puller (cli) server expected to run on the local machine.
+        """
+        from ..tbc import make_default_clients  # Heavy imports, only load if needed
+
+        host, *ports = tbt_connection.split(":")
+        ports = dict(zip(["daq_port", "cli_port", "i2c_port"], map(int, ports)))
+        self.close_tbt()
+        clients = make_default_clients(host, config_file=tbt_config, **ports)
+        self.tbt = dict(zip(["daq", "cli", "i2c"], clients))
+
+    def close_tbt(self) -> None:
+        """Closing the tileboard tester client connections, if any"""
+        if self.tbt:
+            for client in self.tbt.values():
+                client.socket.close()
+        self.tbt = None
 
     def _init_conditions(self, conditions: Optional[str]) -> None:
         if not conditions:
@@ -99,17 +148,66 @@ class Session(object):
         else:
             self.board = Board.from_json(board_file)
 
+    def telemetry(self, max_age: Optional[float] = None) -> TelemetrySnapshot:
+        """
+        Snapshot of the monitoring values. The values are fetched from the
+        hardware in a single call only if the cached snapshot is older than
+        max_age seconds (defaults to telemetry_max_age), so that saving and
+        progress display at the same point share the same snapshot. Moving the
+        gantry should invalidate the snapshot (see invalidate_telemetry).
+        """
+        max_age = self.telemetry_max_age if max_age is None else max_age
+        if (
+            self._telemetry is None
+            or time.monotonic() - self._telemetry.timestamp > max_age
+        ):
+            values = self.hw.get_telemetry()
+            self._telemetry = TelemetrySnapshot(timestamp=time.monotonic(), **values)
+        return self._telemetry
+
+    def invalidate_telemetry(self) -> None:
+        """Forcing the next telemetry call to fetch values from the hardware"""
+        self._telemetry = None
+
+    def set_dry_run_telemetry(self, coord: Tuple[float, float, float]) -> None:
+        """
+        Setting the telemetry snapshot for dry runs, where the hardware is not
+        accessed: the monitoring values are NaN and the gantry coordinates are
+        the requested position. The snapshot is kept until invalidated.
+        """
+        self._telemetry = TelemetrySnapshot(
+            timestamp=math.inf,
+            led_lv=math.nan,
+            led_hv=math.nan,
+            led_temp=math.nan,
+            det_temp=math.nan,
+            det_hv=math.nan,
+            gantry_coord=tuple(coord),
+        )
+
     def update_pbar_data(self, **kwargs: Dict[str, str]) -> None:
+        snapshot = self.telemetry()
         self.pbar.set_postfix(
             {
-                "Gantry": "({0:0.1f},{1:0.1f},{2:0.1f})".format(*self.hw.get_coord()),
-                "LV": f"{self.hw.get_ledlv():5.3f}V",
-                "PT": f"{self.hw.get_ledtemp():4.1f}C",
-                "ST": f"{self.hw.get_dettemp():4.1f}C",
+                "Gantry": "({0:0.1f},{1:0.1f},{2:0.1f})".format(*snapshot.gantry_coord),
+                "LV": f"{snapshot.led_lv:5.3f}V",
+                "PT": f"{snapshot.led_temp:4.1f}C",
+                "ST": f"{snapshot.det_temp:4.1f}C",
                 **kwargs,
             }
         )
 
+    def tbt_request_summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Summary of the request latencies of the tileboard tester clients, see
+        tbc.RequestStats for the format of the per-client summary.
+        """
+        if not self.tbt:
+            return {}
+        return {
+            name: client.request_stats.summary() for name, client in self.tbt.items()
+        }
+
     # TODO: Do we need to check for closing methods on exit?
     # def __del__(self):
     #     if isinstance(self.hw, gmqclient.HWControlClient):
@@ -158,6 +256,15 @@ def add_session_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
         """,
     )
     group.add_argument("--board", type=str, help=Session._init_board.__doc__)
+    group.add_argument(
+        "--telemetry_max_age",
+        type=float,
+        help="""
+        Maximum age (in seconds) of the monitoring values stored with each
+        data point. Monitoring values are always fetched again after the gantry
+        is moved.
+        """,
+    )
     group.add_argument(
         "--hw_connection",
         type=str,
@@ -167,6 +274,23 @@ def add_session_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
         hosting the gantry control sever session (usually a RPi).
         """,
     )
+    group.add_argument(
+        "--tbt_connection",
+        type=str,
+        help="""
+        Connection settings for the tileboard tester clients, required for
+        detectors using the tileboard readout. Should be in the format of
+        '<host>[:<daq_port>:<cli_port>:<i2c_port>]', where "host" is the
+        tileboard tester machine. The data puller server is expected to run on
+        the local machine.
+        """,
+    )
+    group.add_argument(
+        "--tbt_config",
+        type=str,
+        default=TBT_CONFIG_TEMPLATE,
+        help="YAML configuration file used by the tileboard tester clients",
+    )
 
     return parser
 
@@ -212,3 +336,19 @@ def _get_dettemp(self):
 def _get_dethv(self):
     # TODO!!
     return 0
+
+
+def _get_telemetry(self) -> Dict[str, Any]:
+    """
+    All monitoring values required for a TelemetrySnapshot. This is the single
+    point of fetching the monitoring values, so that it can be replaced by a
+    single batched request once supported by the gantry control server.
+    """
+    return dict(
+        led_lv=self.get_ledlv(),
+        led_hv=self.get_ledhv(),
+        led_temp=self.get_ledtemp(),
+        det_temp=self.get_dettemp(),
+        det_hv=self.get_dethv(),
+        gantry_coord=tuple(self.get_coord()),
+    )
@@ -0,0 +1,152 @@
+"""
+stats.py
+
+Helper classes for accumulating statistics of a stream of values without
+needing to keep the full list of values in memory.
+"""
+
+import numpy
+
+
+class StreamingStats(object):
+    """
+    Running count, mean and variance of a stream of values. Single values are
+    added using the Welford algorithm, while blocks of values are merged using
+    the parallel update formula of Chan et al, so that the results are
+    numerically stable regardless of how the stream is chunked. The variance
+    follows the numpy.std convention (no degrees of freedom correction).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared differences from the mean
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def extend(self, values) -> None:
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        if len(values) == 0:
+            return
+        mean = numpy.mean(values)
+        self._merge(len(values), mean, numpy.sum((values - mean) ** 2))
+
+    def merge(self, other: "StreamingStats") -> None:
+        self._merge(other.count, other.mean, other._m2)
+
+    def _merge(self, count: int, mean: float, m2: float) -> None:
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / self.count if self.count > 0 else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance**0.5
+
+    @property
+    def sem(self) -> float:
+        """Standard error of the mean"""
+        return self.std / self.count**0.5 if self.count > 0 else 0.0
+
+
+class StreamingBounds(StreamingStats):
+    """
+    Running statistics that additionally keep track of the running minimum and
+    maximum, so that checking whether a new value is within a tolerance of all
+    previous values does not require the full history. Values can also be
+    numpy arrays of fixed shape, in which case the statistics are computed
+    element-wise. The state can be stored to and restored from JSON.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.min = None
+        self.max = None
+
+    def add(self, x) -> None:
+        x = numpy.asarray(x, dtype=numpy.float64)
+        super().add(x)
+        self.min = x if self.min is None else numpy.minimum(self.min, x)
+        self.max = x if self.max is None else numpy.maximum(self.max, x)
+
+    def extend(self, values) -> None:
+        for x in values:
+            self.add(x)
+
+    def merge(self, other: "StreamingBounds") -> None:
+        super().merge(other)
+        for attr, func in [("min", numpy.minimum), ("max", numpy.maximum)]:
+            ours, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if ours is None else ours)
+            if ours is not None and theirs is not None:
+                setattr(self, attr, func(ours, theirs))
+
+    def is_within(self, x, tolerance: float) -> bool:
+        """Whether the value is within tolerance of all previous values"""
+        if self.count == 0:
+            return True
+        x = numpy.asarray(x, dtype=numpy.float64)
+        return bool(
+            numpy.all(self.max - x <= tolerance)
+            and numpy.all(x - self.min <= tolerance)
+        )
+
+    def to_json(self):
+        return {
+            k: numpy.asarray(v).tolist() if v is not None else None
+            for k, v in dict(
+                count=self.count,
+                mean=self.mean,
+                m2=self._m2,
+                min=self.min,
+                max=self.max,
+            ).items()
+        }
+
+    @classmethod
+    def from_json(cls, jsonmap) -> "StreamingBounds":
+        bounds = cls()
+        bounds.count = jsonmap["count"]
+        bounds.mean, bounds._m2, bounds.min, bounds.max = [
+            (
+                numpy.asarray(jsonmap[k], dtype=numpy.float64)
+                if jsonmap[k] is not None
+                else None
+            )
+            for k in ["mean", "m2", "min", "max"]
+        ]
+        return bounds
+
+
+## Simple cell for helping with unit testing
+if __name__ == "__main__":
+    x = numpy.random.normal(loc=1e6, scale=3, size=10000)
+    s = StreamingStats()
+    for v in x[:10]:
+        s.add(v)
+    for chunk in numpy.array_split(x[10:], 7):
+        s.extend(chunk)
+    print(s.count, s.mean - numpy.mean(x), s.std - numpy.std(x))
+
+    h = numpy.random.normal(loc=[40, 0], scale=0.1, size=(1000, 2))
+    b = StreamingBounds()
+    b.extend(h[:500])
+    c = StreamingBounds.from_json(b.to_json())
+    c.extend(h[500:])
+    print(c.count, c.mean - numpy.mean(h, axis=0), c.std - numpy.std(h, axis=0))
+    print(
+        c.is_within([40, 0], 0.5),
+        c.is_within([40, 0], 0.5) == all(numpy.all(abs(h - [40, 0]) <= 0.5, axis=1)),
+    )
@@ -67,7 +67,12 @@ def get_gantry_coord(session_instance: session.GUISession):
 
 def get_tbtester_telemetry(session_instance: session.GUISession):
     # TODO: Properly implement
-    return dict(tb_sipm_bias=_nan_, tb_led_bias=_nan_, tb_temp=_nan_)
+    return dict(
+        tb_sipm_bias=_nan_,
+        tb_led_bias=_nan_,
+        tb_temp=_nan_,
+        tb_request_stats=session_instance.tbt_request_summary(),
+    )
 
 
 def get_gmq_telemetry(session_instance: session.GUISession):
@@ -47,6 +47,8 @@ __run_action_method_map__ = {
     # Connecting to the various hardware controller clients
     "gmq_disconnect": hardware.gmq_disconnect,
     "gmq_connect": hardware.gmq_connect,
+    "tbt_disconnect": hardware.tbt_disconnect,
+    "tbt_connect": hardware.tbt_connect,
     # Simple control instructions
     "gantry_move_to": hardware.gantry_move_to,
     # Starting a new session
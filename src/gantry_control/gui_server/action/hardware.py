@@ -23,5 +23,20 @@ def gmq_connect(session: GUISession, host: str, port: int):
     hardware.sync_hardware_status(session)
 
 
+def tbt_disconnect(session: GUISession):
+    """"""
+    session.logger.info("Disconnected from tileboard tester")
+    session.close_tbt()
+    hardware.sync_hardware_status(session)
+
+
+def tbt_connect(session: GUISession, connection: str, config: str):
+    """Connection to the tileboard tester, see Session._init_tbt"""
+    session.logger.info(f"Attempting to connect to tileboard tester {connection}")
+    session._init_tbt(connection, config)
+    hardware.sync_hardware_status(session)
+
+
 def gantry_move_to(session: GUISession, x: float, y: float, z: float):
     session.hw.move_to(x=x, y=y, z=z)
+    session.invalidate_telemetry()
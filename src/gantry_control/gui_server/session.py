@@ -13,7 +13,7 @@ import enum
 import logging
 import os
 from dataclasses import dataclass, field
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import flask
 import flask_socketio
@@ -21,6 +21,7 @@ import gmqclient
 
 # Additional data classes. Corresponding containers should be implemented in
 # the gui_client/src/session.ts type definition
+from ..cli import serialize
 from ..cli.board import Board, Conditions
 from ..cli.loghandle import MemHandler, SocketHandler
 from ..cli.session import Session
@@ -36,6 +37,9 @@ class TelemetryEntry:
     gmq_pulser_lv: float
     gmq_pulser_hv: float
     gantry_coord: Tuple[float, float, float]
+    # Request latency summary of the tileboard tester clients, see
+    # Session.tbt_request_summary
+    tb_request_stats: Dict[str, Dict[str, Dict[str, float]]]
 
 
 class ActionCode(enum.IntEnum):
@@ -106,7 +110,9 @@ class GUISession(Session):
             template_folder=self._js_client_path,
             static_folder=os.path.join(self._js_client_path, "static"),
         )
-        self.socket = flask_socketio.SocketIO(self.app, cors_allowed_origins="*")
+        self.socket = flask_socketio.SocketIO(
+            self.app, cors_allowed_origins="*", json=serialize
+        )
 
         # Adding additional messages for the current progress
         self.telemetry_logger = collections.deque([], maxlen=1024)
@@ -15,14 +15,12 @@ def sync_hardware_status(session: GUISession):
         return f"{hw._host}:{hw._port}"
 
     def _make_tileboard_status():
-        # TODO properly implement tileboard testing status
-        return None
         tbt = session.tbt
         if tbt is None:
             return None
-        if tbt.socket.closed():
+        if tbt["daq"].socket.closed:
             return None
-        return None
+        return f"{tbt['daq'].ip}:{tbt['daq'].port}"
 
     session.socket.emit(
         "update-session-hardware-status",
@@ -2,7 +2,8 @@ import glob
 import os
 import pathlib
 
-from ...cli.board import PROJECT_ROOT
+from ...cli.board import DEFAULT_STORE_PATH, PROJECT_ROOT
+from ...cli.catalog import ResultsCatalog
 from ..session import GUISession
 
 
@@ -20,5 +21,5 @@ def template_yamls(session: GUISession):
 
 
 def saved_sessions(session: GUISession):
-    savefiles = glob.glob(os.path.join(PROJECT_ROOT, "results/*.json"))
+    savefiles = ResultsCatalog(DEFAULT_STORE_PATH).board_files()
     return [pathlib.Path(os.path.basename(x)).stem for x in savefiles]
@@ -1,13 +1,19 @@
 """ 
 Representing some server-side information as a downloadable file
 """
-from flask import jsonify
+from flask import Response
 
+from ...cli import serialize
 from ...cli.format import logrecord_to_dict, logrecord_to_line
 from ..session import GUISession
 
+
+def _json_response(content):
+    return Response(serialize.dumps(content), mimetype="application/json")
+
+
 # Default casting methods
-__filetype_map__ = {"json": jsonify, "txt": lambda x: str(x)}
+__filetype_map__ = {"json": _json_response, "txt": lambda x: str(x)}
 
 
 def action_log(session: GUISession, filetype: str):
@@ -17,6 +23,6 @@ def action_log(session: GUISession, filetype: str):
 def message_log(session: GUISession, filetype: str):
     content = session._mem_handlers.record_list
     if filetype == "json":
-        return jsonify([logrecord_to_dict(x) for x in content])
+        return _json_response([logrecord_to_dict(x) for x in content])
     else:
         return "\n".join([logrecord_to_line(x) for x in content])
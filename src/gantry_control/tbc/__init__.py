@@ -1,2 +1,3 @@
 from . import rocv2
 from .tbc import make_default_clients, run_daq, I2CController, DAQController
+from .tbc import RequestStats
@@ -0,0 +1,555 @@
+"""
+mock_server.py
+
+Local stand-in for the ZMQ servers running on the tileboard tester, so that the
+controllers defined in `tbc.py` can be exercised without a physical tileboard.
+Three servers are provided, each mimicking the request/reply protocol expected
+by the corresponding client:
+
+- `MockDAQServer`: the fast-control server addressed by `DAQController`. Once
+  started, synthetic HGCROCv2 events are pushed over a ZMQ PUSH socket at a
+  configurable rate, the same way the tester pushes data to the client.
+- `MockCLIServer`: the data puller/client server also addressed by a
+  `DAQController`. Pulls the event stream of the DAQ server and writes it into
+  a `.raw` file that can be decoded by `rocv2.from_raw`.
+- `MockI2CServer`: the slow control server addressed by the `I2CController`.
+
+The `MockTileboard` container starts all 3 servers on the local machine, and
+the `benchmark` method measures the end-to-end acquisition rate of the
+`run_daq` routine against the mock servers. This can be run directly using:
+
+```bash
+python -m gantry_control.tbc.mock_server --runs 20 --events 1000
+```
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy
+import yaml
+import zmq
+
+from .tbc import DEFAULT_CONFIG_FILE, _deep_merge_, _yaml_loader_
+
+# Data format constants, see HGCROCv2RawData.h
+_HGCROC_DATA_BUF_SIZE_ = 41
+_TRIG_LATENCY_ACQUIRE_LENGTH_ = 20
+_N_HALVES_ = 2
+_N_TRIG_LINKS_ = 4
+_N_DATA_WORDS_ = _HGCROC_DATA_BUF_SIZE_ * _N_HALVES_ + _N_TRIG_LINKS_
+
+# Layout of a single serialized HGCROCv2RawData instance in the boost binary
+# archive: 2 int members followed by 2 std::vector<uint32_t> members, with each
+# vector prefixed by its collection size.
+_RAW_EVENT_DTYPE_ = numpy.dtype(
+    [
+        ("event", "<i4"),
+        ("chip", "<i4"),
+        ("ndata", "<u8"),
+        ("data", "<u4", (_N_DATA_WORDS_,)),
+        ("nlatency", "<u8"),
+        ("latency", "<u4", (_TRIG_LATENCY_ACQUIRE_LENGTH_,)),
+    ]
+)
+
+
+def _make_archive_header() -> bytes:
+    """
+    Header of a boost binary archive, followed by the class information of the
+    first HGCROCv2RawData object. The binary archive stores:
+
+    - The archive signature string (size_t length + characters).
+    - The archive library version (uint16).
+    - The size of int, long, float and double (1 byte each), and an int used
+      for the endianness check.
+    - For the first instance of the class: the tracking flag (1 byte) and the
+      class version (uint32).
+    """
+    signature = b"serialization::archive"
+    return b"".join(
+        [
+            numpy.uint64(len(signature)).tobytes(),
+            signature,
+            numpy.uint16(17).tobytes(),
+            bytes([4, 8, 4, 8]),
+            numpy.int32(1).tobytes(),
+            bytes([0]),  # Not tracked
+            numpy.uint32(0).tobytes(),  # Class version
+        ]
+    )
+
+
+def _make_crc_table() -> numpy.ndarray:
+    """Lookup table of the CRC32 (polynomial 0x04C11DB7, non-reflected)"""
+    table = numpy.arange(256, dtype=numpy.uint32) << numpy.uint32(24)
+    for _ in range(8):
+        table = numpy.where(
+            table & numpy.uint32(0x80000000),
+            (table << numpy.uint32(1)) ^ numpy.uint32(0x04C11DB7),
+            table << numpy.uint32(1),
+        ).astype(numpy.uint32)
+    return table
+
+
+_CRC_TABLE_ = _make_crc_table()
+
+
+def _crc32_words(words: numpy.ndarray) -> numpy.ndarray:
+    """
+    CRC32 used by the HGCROC data format to check for data corruption. The CRC
+    is calculated over the big-endian byte representation of the data words.
+    Calculation is vectorized over the events (first axis of the inputs).
+    """
+    data_bytes = words.astype(">u4").view(numpy.uint8).reshape(len(words), -1)
+    crc = numpy.zeros(len(words), dtype=numpy.uint32)
+    for i in range(data_bytes.shape[1]):
+        index = ((crc >> numpy.uint32(24)) ^ data_bytes[:, i]) & numpy.uint32(0xFF)
+        crc = (crc << numpy.uint32(8)) ^ _CRC_TABLE_[index]
+    return crc
+
+
+def make_raw_events(
+    n_events: int,
+    event_offset: int = 0,
+    chip: int = 0,
+    pedestal: float = 100,
+    noise: float = 3,
+    rng: Optional[numpy.random.Generator] = None,
+) -> numpy.ndarray:
+    """
+    Generating the record array of synthetic events, ready to be written into
+    a raw data file. All channels are filled with Gaussian pedestal-like ADC
+    values, with the trigger links always marked as valid.
+    """
+    if rng is None:
+        rng = numpy.random.default_rng()
+    events = numpy.zeros(n_events, dtype=_RAW_EVENT_DTYPE_)
+    events["event"] = numpy.arange(event_offset, event_offset + n_events)
+    events["chip"] = chip
+    events["ndata"] = _N_DATA_WORDS_
+    events["nlatency"] = _TRIG_LATENCY_ACQUIRE_LENGTH_
+
+    index = events["event"].astype(numpy.uint32)
+    for half in range(_N_HALVES_):
+        block = numpy.zeros((n_events, _HGCROC_DATA_BUF_SIZE_), dtype=numpy.uint32)
+        block[:, 0] = (
+            (numpy.uint32(0x5) << numpy.uint32(28))
+            | ((index % 3564) << numpy.uint32(16))
+            | ((index & numpy.uint32(0x3F)) << numpy.uint32(10))
+            | ((index & numpy.uint32(0x7)) << numpy.uint32(7))
+            | numpy.uint32(0x5)
+        )
+        adc = rng.normal(pedestal, noise, size=(n_events, 39))
+        adc = numpy.clip(numpy.rint(adc), 0, 0x3FF).astype(numpy.uint32)
+        # Common mode words
+        block[:, 1] = (adc[:, 0] << numpy.uint32(10)) | adc[:, 1]
+        # Channel words: (totflag=0, adcm, adc, toa)
+        block[:, 2:39] = (adc[:, 1:38] << numpy.uint32(20)) | (
+            adc[:, 2:39] << numpy.uint32(10)
+        )
+        block[:, 39] = _crc32_words(block[:, :39])
+        block[:, 40] = 0xACCCCCCC  # Idle word
+        start = half * _HGCROC_DATA_BUF_SIZE_
+        events["data"][:, start : start + _HGCROC_DATA_BUF_SIZE_] = block
+
+    events["data"][:, _HGCROC_DATA_BUF_SIZE_ * _N_HALVES_ :] = 0xA0000000
+    events["latency"][:, 0] = 0x1 << 24
+    return events
+
+
+def write_raw(filename: str, events: numpy.ndarray) -> None:
+    """Writing a record array of events into a raw data file"""
+    with open(filename, "wb") as f:
+        f.write(_make_archive_header())
+        f.write(events.tobytes())
+
+
+class MockZMQServer:
+    """
+    @brief Common base for the mock servers.
+
+    @details Each server runs the ZMQ reply loop in a separate thread. The
+    reply loop polls the socket with a finite timeout so that the thread can be
+    stopped cleanly. Request messages are processed by the `handle` method,
+    which should be overloaded by the specialized classes. Configuration
+    fragments sent by the client are merged into the `config` attribute.
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.config: Dict = {}
+        self.context = zmq.Context.instance()
+
+        self._expect_config = False
+        self._active = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._active = True
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._active = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run_loop(self) -> None:
+        socket = self.context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(f"tcp://{self.host}:{self.port}")
+        try:
+            while self._active:
+                if not socket.poll(timeout=100):
+                    continue
+                message = socket.recv().decode()
+                socket.send_string(self._dispatch(message))
+        finally:
+            socket.close()
+
+    def _dispatch(self, message: str) -> str:
+        if self._expect_config:
+            self._expect_config = False
+            _deep_merge_(self.config, yaml.load(message, Loader=_yaml_loader_))
+            return "configured"
+        return self.handle(message)
+
+    def handle(self, message: str) -> str:
+        if message == "configure":
+            self._expect_config = True
+            return "ready"
+        return f"unrecognized request [{message}]"
+
+
+class MockDAQServer(MockZMQServer):
+    """
+    @brief Mock of the fast control server.
+
+    @details After the `start` request, the requested number of events are
+    pushed to the data port (`daq.zmqPushPull_port` in the configuration) in
+    blocks, throttled to the given event rate. An empty message is pushed at
+    the end of the run to signal to the data puller that no more data is
+    expected.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        host: str = "127.0.0.1",
+        rate: float = 1e4,
+        block_size: int = 200,
+    ):
+        super().__init__(port, host)
+        self.rate = rate
+        self.block_size = block_size
+        self._run_thread: Optional[threading.Thread] = None
+        self._run_active = False
+        self._push_socket = None
+
+    @property
+    def n_events(self) -> int:
+        daq = self.config.get("daq", {})
+        if "NEvents" in daq:
+            return int(daq["NEvents"])
+        menu = daq.get("menus", {}).get(daq.get("active_menu", ""), {})
+        return int(menu.get("NEvents", 0))
+
+    @property
+    def push_port(self) -> int:
+        return int(self.config.get("daq", {}).get("zmqPushPull_port", 8888))
+
+    def stop(self) -> None:
+        self._stop_run()
+        super().stop()
+        if self._push_socket is not None:
+            self._push_socket.close()
+            self._push_socket = None
+
+    def handle(self, message: str) -> str:
+        if message == "initialize":
+            return "ready"
+        elif message == "start":
+            self._start_run()
+            return "running"
+        elif message == "run_done":
+            return "notdone" if self._run_active else "done"
+        elif message == "stop":
+            self._stop_run()
+            return "stopped"
+        return super().handle(message)
+
+    def _start_run(self) -> None:
+        self._stop_run()
+        if self._push_socket is None:
+            self._push_socket = self.context.socket(zmq.PUSH)
+            self._push_socket.setsockopt(zmq.LINGER, 1000)
+            self._push_socket.bind(f"tcp://{self.host}:{self.push_port}")
+        self._run_active = True
+        self._run_thread = threading.Thread(target=self._push_events, daemon=True)
+        self._run_thread.start()
+
+    def _stop_run(self) -> None:
+        self._run_active = False
+        if self._run_thread is not None:
+            self._run_thread.join()
+            self._run_thread = None
+
+    def _send(self, message: bytes) -> bool:
+        """Sending with periodic checks on whether the run has been stopped"""
+        while self._run_active:
+            if self._push_socket.poll(timeout=100, flags=zmq.POLLOUT):
+                self._push_socket.send(message)
+                return True
+        return False
+
+    def _push_events(self) -> None:
+        rng = numpy.random.default_rng()
+        n_events = self.n_events
+        start = time.perf_counter()
+        for offset in range(0, n_events, self.block_size):
+            count = min(self.block_size, n_events - offset)
+            events = make_raw_events(count, event_offset=offset, rng=rng)
+            # Throttling to the requested event rate.
+            wait = start + (offset + count) / self.rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            if not self._send(events.tobytes()):
+                break
+        else:
+            self._send(b"")  # End of run marker
+            self._run_active = False
+            return
+        # Run was stopped early, still attempt to notify the data puller.
+        try:
+            self._push_socket.send(b"", flags=zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+
+
+class MockCLIServer(MockZMQServer):
+    """
+    @brief Mock of the data puller server.
+
+    @details On the `start` request, a PULL socket is connected to the DAQ
+    server defined in the `client` configuration section, and all data blocks
+    received are appended to the file `<outputDirectory>/<run_type>0.raw` until
+    the end-of-run marker is received. The `stop` request waits for all data to
+    be written before replying.
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1", timeout: float = 10):
+        super().__init__(port, host)
+        self.timeout = timeout
+        self._run_thread: Optional[threading.Thread] = None
+        # The pull socket is kept across runs, so that the DAQ server never
+        # distributes data to a stale connection.
+        self._pull_socket = None
+        self._pull_endpoint = ""
+
+    @property
+    def client_config(self) -> Dict:
+        # Older configuration formats use the "global" section.
+        return self.config.get("client", self.config.get("global", {}))
+
+    @property
+    def output_file(self) -> str:
+        return os.path.join(
+            self.client_config.get("outputDirectory", "data"),
+            self.client_config.get("run_type", "default") + "0.raw",
+        )
+
+    def handle(self, message: str) -> str:
+        if message == "initialize":
+            return "ready"
+        elif message == "start":
+            self._wait_run()
+            self._run_thread = threading.Thread(target=self._pull_events, daemon=True)
+            self._run_thread.start()
+            return "running"
+        elif message == "stop":
+            self._wait_run()
+            return "stopped"
+        return super().handle(message)
+
+    def stop(self) -> None:
+        super().stop()
+        self._wait_run()
+        if self._pull_socket is not None:
+            self._pull_socket.close()
+            self._pull_socket = None
+
+    def _wait_run(self) -> None:
+        if self._run_thread is not None:
+            self._run_thread.join(timeout=self.timeout)
+            self._run_thread = None
+
+    def _get_pull_socket(self):
+        endpoint = "tcp://{ip}:{port}".format(
+            ip=self.client_config.get("serverIP", "localhost"),
+            port=self.client_config.get("data_push_port", 8888),
+        )
+        if self._pull_socket is None or endpoint != self._pull_endpoint:
+            if self._pull_socket is not None:
+                self._pull_socket.close()
+            self._pull_socket = self.context.socket(zmq.PULL)
+            self._pull_socket.setsockopt(zmq.LINGER, 0)
+            self._pull_socket.connect(endpoint)
+            self._pull_endpoint = endpoint
+        return self._pull_socket
+
+    def _pull_events(self) -> None:
+        socket = self._get_pull_socket()
+        with open(self.output_file, "wb") as f:
+            f.write(_make_archive_header())
+            while socket.poll(timeout=int(self.timeout * 1000)):
+                block = socket.recv()
+                if len(block) == 0:  # End of run marker
+                    break
+                f.write(block)
+
+
+class MockI2CServer(MockZMQServer):
+    """
+    @brief Mock of the I2C slow control server.
+
+    @details Set requests are stored such that they can be read back, read
+    requests of the monitoring values return fixed nominal values.
+    """
+
+    _read_values_ = {
+        "read_sipm_voltage": 42.0,
+        "read_sipm_current": 0.001,
+        "read_led_voltage": 6.0,
+        "read_led_current": 0.01,
+    }
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        super().__init__(port, host)
+        self.values: Dict[str, str] = {}
+
+    def handle(self, message: str) -> str:
+        command, *args = message.split() or [""]
+        if command == "initialize":
+            self._expect_config = True
+            return "ready"
+        elif command == "resettdc":
+            return yaml.dump({"status": "done"})
+        elif command in MockI2CServer._read_values_:
+            return str(MockI2CServer._read_values_[command])
+        elif command.startswith("set_"):
+            self.values[command[4:]] = " ".join(args)
+            return "done"
+        elif command.startswith("get_") or command.startswith("read_"):
+            return self.values.get(command.split("_", 1)[1], "0")
+        return super().handle(message)
+
+
+class MockTileboard:
+    """
+    Container for running the DAQ, CLI and I2C mock servers on the local
+    machine. Can be used as a context manager to make sure the servers are
+    stopped on exit.
+    """
+
+    def __init__(
+        self,
+        daq_port: int = 6000,
+        cli_port: int = 6001,
+        i2c_port: int = 5555,
+        rate: float = 1e4,
+        host: str = "127.0.0.1",
+    ):
+        self.daq = MockDAQServer(daq_port, host=host, rate=rate)
+        self.cli = MockCLIServer(cli_port, host=host)
+        self.i2c = MockI2CServer(i2c_port, host=host)
+
+    def start(self) -> None:
+        for server in [self.daq, self.cli, self.i2c]:
+            server.start()
+
+    def stop(self) -> None:
+        for server in [self.daq, self.cli, self.i2c]:
+            server.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def benchmark(
+    n_runs: int = 20,
+    n_events: int = 1000,
+    rate: float = 1e6,
+    config_file: str = DEFAULT_CONFIG_FILE,
+    decode: bool = True,
+) -> Dict[str, float]:
+    """
+    Measuring the end-to-end acquisition rate of the `run_daq` routine using
+    the mock tileboard servers. If decode is set to false, the time required
+    for the decoding of the raw file is excluded.
+    """
+    from .tbc import make_default_clients, run_daq
+
+    with MockTileboard(rate=rate):
+        daq_client, cli_client, i2c_client = make_default_clients(
+            "127.0.0.1", "127.0.0.1", config_file=config_file
+        )
+
+        start = time.perf_counter()
+        for _ in range(n_runs):
+            run_daq(daq_client, cli_client, n_events, decode=decode)
+        elapsed = time.perf_counter() - start
+
+        for client in [daq_client, cli_client, i2c_client]:
+            client.socket.close()
+
+    return {
+        "runs": n_runs,
+        "events": n_events,
+        "elapsed": elapsed,
+        "acquisitions_per_second": n_runs / elapsed,
+        "events_per_second": n_runs * n_events / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        "mock_server",
+        description="Running the mock tileboard servers or the acquisition benchmark",
+    )
+    parser.add_argument("--runs", type=int, default=20, help="Number of acquisitions")
+    parser.add_argument("--events", type=int, default=1000, help="Events per run")
+    parser.add_argument(
+        "--rate", type=float, default=1e6, help="Event rate of the mock server [Hz]"
+    )
+    parser.add_argument(
+        "--nodecode", action="store_true", help="Exclude raw file decoding"
+    )
+    parser.add_argument(
+        "--serve", action="store_true", help="Only run the servers until interupted"
+    )
+    args = parser.parse_args()
+
+    if args.serve:
+        with MockTileboard(rate=args.rate):
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+    else:
+        result = benchmark(args.runs, args.events, args.rate, decode=not args.nodecode)
+        print(
+            "{runs} runs of {events} events in {elapsed:.3f}s: "
+            "{acquisitions_per_second:.2f} acquisitions/s, "
+            "{events_per_second:.0f} events/s".format(**result)
+        )
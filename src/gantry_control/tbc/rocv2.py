@@ -75,7 +75,7 @@ class rocv2_behavior(awkward.Array):
         simple conversion found in pedestal_run.py file. Where we simply shift the
         indices of the second half.
         """
-        return self._channel + (np.max(self._channel) + 1) * self.half
+        return self._channel + (numpy.max(self._channel) + 1) * self.half
 
 
 awkward.behavior[".", "rocv2"] = rocv2_behavior  # Loading behavior
@@ -86,7 +86,7 @@ def from_raw(raw_file: str) -> awkward.Array:
     Reading a raw data file, formatting into the columnar format, and perform the
     first level data mangling, as well as include the custom column behaviors.
     """
-    container = rocv2(raw_file)
+    container = _rocv2(raw_file)
     n_entries = len(container.event())
 
     shape_dict = {
@@ -108,11 +108,11 @@ def from_raw(raw_file: str) -> awkward.Array:
         "tot": container.nhalves * container.nchannels,
         "toa": container.nhalves * container.nchannels,
         "totflag": container.nhalves * container.nchannels,
-        # Trigger link
-        "validtp": container.nlinks,
-        "channelsumid": container.nlinks,
-        "rawsum": container.nlinks,
-        "decompresssum": container.nlinks,
+        # Trigger link (4 trigger cells per link)
+        "validtp": container.nlinks * 4,
+        "channelsumid": container.nlinks * 4,
+        "rawsum": container.nlinks * 4,
+        "decompresssum": container.nlinks * 4,
     }
 
     def make_field_name(name):
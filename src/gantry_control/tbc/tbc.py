@@ -1,20 +1,80 @@
 """
 @file TBController.py
 """
-import zmq, yaml, time, copy, uproot, os
+import zmq, yaml, time, copy, uproot, os, collections
 import awkward as ak
+import numpy
 from .rocv2 import from_raw
 
-from typing import Mapping, List, Optional, Tuple
+from typing import Dict, Mapping, List, Optional, Tuple
 
+# Using the LibYAML C implementations if PyYAML was built with it, the pure
+# python implementations are roughly an order of magnitude slower.
+_yaml_loader_ = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_yaml_dumper_ = getattr(yaml, "CDumper", yaml.Dumper)
 
-def _deep_merge_(dest: Mapping, update: Mapping, path=Optional[List[str]]):
+# Default configuration of the tileboard tester clients, shipped with the
+# repository configuration templates
+DEFAULT_CONFIG_FILE = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "../../../config_templates/tbc_yaml/roc_config_ConvGain4.yaml",
+    )
+)
+
+# Parsed configuration templates, keyed by absolute path. Values are the
+# modification time of the file and the parsed content.
+_config_cache_: Dict[str, Tuple[int, Dict]] = {}
+
+
+def load_yaml_file(filename: str) -> Dict:
+    """
+    Loading a YAML configuration file. The parsed content is cached by path and
+    modification time, so that the same template is only parsed once. A deep
+    copy of the cached content is returned so that the caller can freely
+    modify the configuration.
+    """
+    filename = os.path.abspath(filename)
+    mtime = os.stat(filename).st_mtime_ns
+    cached = _config_cache_.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename) as fin:
+            cached = (mtime, yaml.load(fin, Loader=_yaml_loader_))
+        _config_cache_[filename] = cached
+    return copy.deepcopy(cached[1])
+
+
+def dump_yaml(
+    config: Mapping, cache: Optional[Dict[str, Tuple[str, str]]] = None
+) -> str:
+    """
+    Serializing a configuration to a YAML string. If a cache dictionary is
+    given, the serialized string of each top-level entry is memoized in the
+    cache, along with the `repr` of the entry, which is used to detect
+    modifications (`repr` is evaluated in C and is much faster than emitting
+    YAML). Entries are concatenated in sorted order to match the default
+    behavior of `yaml.dump`.
+    """
+    if cache is None:
+        return yaml.dump(config, Dumper=_yaml_dumper_)
+    blocks = []
+    for key in sorted(config.keys()):
+        fingerprint = repr(config[key])
+        cached = cache.get(key)
+        if cached is None or cached[0] != fingerprint:
+            cached = (fingerprint, yaml.dump({key: config[key]}, Dumper=_yaml_dumper_))
+            cache[key] = cached
+        blocks.append(cached[1])
+    return "".join(blocks)
+
+
+def _deep_merge_(dest: Mapping, update: Mapping, path: Optional[List[str]] = None):
     """
     Updating a deeply nested dictionary-like object "dest" in-place using an
     update dictionary. Adapted from this [response][response] on StackOverflow,
     except at because YAML configurations are not strictly dictionaries, we
     change the method of detecting nested structure to anything having the
-    `__getitem__` method.
+    `keys` method (strings and lists are treated as values).
 
     [response]:
     https://stackoverflow.com/questions/7204805/how-to-merge-dictionaries-of-dictionaries/7205107#7205107
@@ -23,8 +83,8 @@ def _deep_merge_(dest: Mapping, update: Mapping, path=Optional[List[str]]):
         path = []
     for key in update:
         if key in dest:
-            dest_is_nested = hasattr(dest[key], "__getitem__")
-            up_is_nested = hasattr(update[key], "__getitem__")
+            dest_is_nested = hasattr(dest[key], "keys")
+            up_is_nested = hasattr(update[key], "keys")
             if dest_is_nested and up_is_nested:
                 # If both are nested recursively update nested structure
                 _deep_merge_(dest[key], update[key], path + [str(key)])
@@ -34,7 +94,7 @@ def _deep_merge_(dest: Mapping, update: Mapping, path=Optional[List[str]]):
             else:
                 # Otherwise there is a structure mismatch
                 raise ValueError(
-                    "Mismatch structure at %s".format(".".join(path + [str(key)]))
+                    "Mismatch structure at {}".format(".".join(path + [str(key)]))
                 )
         else:
             dest[key] = update[key]
@@ -73,9 +133,63 @@ def update_yaml_node(yaml_node, mapping_dict, **kwargs):
         yaml_node[key] = kwargs.get(value[0], value[1])
 
 
+class RequestStats:
+    """
+    @brief Per-command book keeping of the request round trip time.
+
+    @details For each command (the first word of the request string, or an
+    explicit label for configuration payloads), we keep the total number of
+    requests, the total number of bytes sent and received, and the latency of
+    the latest `maxlen` requests used for the percentile calculations.
+    """
+
+    _percentiles_ = (50, 95, 99)
+
+    def __init__(self, maxlen: int = 1024):
+        self.maxlen = maxlen
+        self.reset()
+
+    def reset(self):
+        self.count: Dict[str, int] = collections.defaultdict(int)
+        self.bytes_sent: Dict[str, int] = collections.defaultdict(int)
+        self.bytes_recv: Dict[str, int] = collections.defaultdict(int)
+        self.latency: Dict[str, collections.deque] = collections.defaultdict(
+            lambda: collections.deque([], maxlen=self.maxlen)
+        )
+
+    def record(self, command: str, latency: float, sent: int, recv: int):
+        self.count[command] += 1
+        self.bytes_sent[command] += sent
+        self.bytes_recv[command] += recv
+        self.latency[command].append(latency)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summary of the requests as a nested dictionary, keyed by the command
+        name. Latency values are given in units of milliseconds.
+        """
+        ret = {}
+        for command, count in self.count.items():
+            latency = numpy.array(self.latency[command]) * 1000
+            pval = numpy.percentile(latency, RequestStats._percentiles_)
+            ret[command] = {
+                "count": count,
+                **{f"p{p}": float(v) for p, v in zip(RequestStats._percentiles_, pval)},
+                "max": float(numpy.max(latency)),
+                "bytes_sent": self.bytes_sent[command],
+                "bytes_recv": self.bytes_recv[command],
+            }
+        return ret
+
+
 class ZMQController:
     """
     @brief Common ZQM client class with YAML configurations
+
+    @details Every request sent via the `send_request` method will have its
+    round trip time and message sizes recorded in the `request_stats` instance.
+    The serialized form of the stored configuration is memoized per top-level
+    entry, so only modified sections are re-serialized on configuration.
     """
 
     def __init__(self, ip: str, port: int, yaml_config=str):
@@ -83,13 +197,19 @@ class ZMQController:
         self.ip = ip
         self.port = port
         self.socket = None
+        self.request_stats = RequestStats()
+        self._dump_cache: Dict[str, Tuple[str, str]] = {}
 
         self.load_config(yaml_config)
         self.reconnect()
 
     def load_config(self, yaml_config):
-        with open(yaml_config) as fin:
-            self.yaml_config = yaml.safe_load(fin)
+        self.yaml_config = load_yaml_file(yaml_config)
+        self._dump_cache = {}
+
+    def dump_config(self) -> str:
+        """Serialized string of the stored configuration"""
+        return dump_yaml(self.yaml_config, self._dump_cache)
 
     def reconnect(self):
         if self.socket is not None:
@@ -99,12 +219,23 @@ class ZMQController:
         self.socket.connect("tcp://" + str(self.ip) + ":" + str(self.port))
         print("Socket connected!!")
 
-    def send_request(self, message: str) -> str:
+    def send_request(self, message: str, command: Optional[str] = None) -> str:
         """
-        Simple ZMQ request/respond pattern used in the subsequent classes.
+        Simple ZMQ request/respond pattern used in the subsequent classes. The
+        command name used for the request book keeping is the first word of
+        the message, unless explicitly specified.
         """
-        self.socket.send_string(message)
-        return self.socket.recv()
+        payload = message.encode()
+        start = time.perf_counter()
+        self.socket.send(payload)
+        response = self.socket.recv()
+        self.request_stats.record(
+            command or message.split(" ", 1)[0],
+            time.perf_counter() - start,
+            len(payload),
+            len(response),
+        )
+        return response
 
     def check_request(self, message: str, check_str: str) -> bool:
         """
@@ -123,14 +254,15 @@ class ZMQController:
         slow!). If a YAML configuration fragment is specified, then the
         configuration updated in the main configuration instances as well.
         """
-        if not self.socket_check("configure", "ready"):
+        if not self.check_request("configure", "ready"):
             raise RuntimeError("Socket is not ready for configuration!")
 
         if yaml_config is None:
-            yaml_config = self.yaml_config
+            payload = self.dump_config()
         else:
             _deep_merge_(self.yaml_config, yaml_config)
-        return self.send_request(yaml.dump(yaml_config))
+            payload = dump_yaml(yaml_config)
+        return self.send_request(payload, command="configure_payload")
 
 
 class I2CController(ZMQController):
@@ -157,30 +289,32 @@ class I2CController(ZMQController):
         def __inner_call__(self, *args):
             assert len(args) == len(arg_names), f"Expected arguments {arg_names}"
             return return_type(
-                self.send_request(" ".join([method_name, *[str(x) for x in args]]))
+                self.send_request(
+                    " ".join([method_name, *[str(x) for x in args]])
+                ).decode()
             )
 
         setattr(I2CController, method_name, __inner_call__)
 
     def __init__(self, ip, port, yaml_config):
-        # """Additional attribute: Masking by detector ID"""
-        super().__init__(ip, port, yaml_config)
-        # Not sure when this is needed. not adding for the time being.
-
-        # Defining additional methods to be used
+        # Defining additional methods to be used. This needs to be done before
+        # the connection is established, as the reconnect method uses them.
         I2CController._define_i2c_method_("read_sipm_voltage", (), float)
         I2CController._define_i2c_method_("read_sipm_current", (), float)
         I2CController._define_i2c_method_("read_led_voltage", (), float)
         I2CController._define_i2c_method_("read_led_current", (), float)
-        I2CController._define_i2c_method_("set_led_dac", ("val"))
+        I2CController._define_i2c_method_("set_led_dac", ("val",))
         I2CController._define_i2c_method_("set_gbtsca_dac", ("dac", "val"))
-        I2CController._define_i2c_method_("read_gbtsca_dac", ("dac"), float)
-        I2CController._define_i2c_method_("read_gbtsca_adc", ("channel"), int)
+        I2CController._define_i2c_method_("read_gbtsca_dac", ("dac",), float)
+        I2CController._define_i2c_method_("read_gbtsca_adc", ("channel",), int)
         I2CController._define_i2c_method_("read_gbtsca_gpio", (), str)
-        I2CController._define_i2c_method_("set_gbtsca_gpio_direction", ("direction"))
+        I2CController._define_i2c_method_("set_gbtsca_gpio_direction", ("direction",))
         I2CController._define_i2c_method_("get_gbtsca_gpio_direction", (), str)
         I2CController._define_i2c_method_("set_gbtsca_gpio_vals", ("vals", "mask"))
 
+        # """Additional attribute: Masking by detector ID"""
+        super().__init__(ip, port, yaml_config)
+        # Not sure when this is needed. not adding for the time being.
         # self.maskedDetIds = []
 
     def reconnect(self):
@@ -198,7 +332,7 @@ class I2CController(ZMQController):
                 control server has been started without error on the
                 tileboard"""
             )
-        self.send_request(yaml.dump(self.yaml_config))
+        self.send_request(self.dump_config(), command="configure_payload")
 
         ## GPIO Settings
         self.set_gbtsca_gpio_direction(0x0FFFFF9C)  # '0': input, '1': output
@@ -214,7 +348,7 @@ class I2CController(ZMQController):
 
     def reset_tdc(self):
         """Resetting the TDC settings"""
-        return yaml.safe_load(self.send_request("resettdc"))
+        return yaml.load(self.send_request("resettdc"), Loader=_yaml_loader_)
 
     """
     More human readable formats for ADC value
@@ -250,7 +384,7 @@ class DAQController(ZMQController):
 
     def stop(self):
         """Ensuring the the signal has been stopped"""
-        return self.socket_send("stop")
+        return self.send_request("stop")
 
     def enable_fast_commands(self, **kwargs):
         """Setting up the fast acquisition settings"""
@@ -290,7 +424,7 @@ class DAQController(ZMQController):
             "prescale": ("prescale", 0),
             "log_rand_bx_period": ("log_rand_bx_period", 0),
         }
-        update_yaml_node(self.yaml_config["daq"]["l1a_settings"], _defaults, **kwargs)
+        update_yaml_node(self.yaml_config["daq"]["l1a_settings"], _defaults_, **kwargs)
 
 
 def make_default_clients(
@@ -299,25 +433,26 @@ def make_default_clients(
     daq_port: int = 6000,
     cli_port: int = 6001,
     i2c_port: int = 5555,
-    config_file: str = "cfg/tbc_yaml/roc_config.yaml",
+    config_file: str = DEFAULT_CONFIG_FILE,
 ):
     """Default construction of the daq/cli/i2c zmq client triplet"""
     daq_client = DAQController(tbt_ip, daq_port, config_file)
     cli_client = DAQController(cli_ip, cli_port, config_file)
     i2c_client = I2CController(tbt_ip, i2c_port, config_file)
 
-    cli_client.yaml_config["global"]["serverIP"] = self.daq_socket.ip
+    cli_client.yaml_config["client"]["serverIP"] = daq_client.ip
     return daq_client, cli_client, i2c_client
 
 
-def run_daq(daq_client, cli_client, n_events):
+def run_daq(daq_client, cli_client, n_events, decode=True):
     """
     @brief Acquiring n_events worth of data.
 
     @details Flushing the data puller configurations to the zmq-client instance.
     We split this into a separate function in case we need to run multiple data
     acquisition routines with different slow settings (frequently used for
-    configuration scanning routines.)
+    configuration scanning routines.) If `decode` is set to false, the path to
+    the raw data file is returned instead of the decoded array.
     """
     # Number of events is set by the the daq_socket yaml configuration
     daq_client.yaml_config["daq"]["NEvents"] = str(n_events)
@@ -325,8 +460,8 @@ def run_daq(daq_client, cli_client, n_events):
     remote_dir = "/tmp/"
     remote_name = "data_acquire"
 
-    cli_client.yaml_config["global"]["outputDirectory"] = remote_dir
-    cli_client.yaml_config["global"]["run_type"] = remote_name
+    cli_client.yaml_config["client"]["outputDirectory"] = remote_dir
+    cli_client.yaml_config["client"]["run_type"] = remote_name
 
     cli_client.configure()
     daq_client.configure()
@@ -339,7 +474,8 @@ def run_daq(daq_client, cli_client, n_events):
     cli_client.stop()
 
     time.sleep(0.1)  # Sleep 100ms for output to be complete
-    return from_raw(f"{remote_dir}/{remote_name}0.raw")
+    raw_file = f"{remote_dir}/{remote_name}0.raw"
+    return from_raw(raw_file) if decode else raw_file
 
 
 # Unit test of Tileboard controller.
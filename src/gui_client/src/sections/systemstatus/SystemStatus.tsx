@@ -1,4 +1,8 @@
-import { TempMonitorStatus, VoltMonitorStatus } from './components/TelemetryData';
+import {
+  RequestLatencyStatus,
+  TempMonitorStatus,
+  VoltMonitorStatus,
+} from './components/TelemetryData';
 import VisualSystem from './components/VisualSystem';
 import GantryStatus from './components/GantryStatus';
 import ActionStatusDisplay from './components/ActionStatus';
@@ -59,6 +63,16 @@ const SystemStatus = () => {
             <VoltMonitorStatus />
           </div>
         </div>
+        <div className='tbrowdiv'>
+          <div className='tbcelldiv statusHeaderOuter'>
+            <div className='statusHeaderMid'>
+              <div className='statusHeader'>Tileboard requests</div>
+            </div>
+          </div>
+          <div className='tbcelldiv'>
+            <RequestLatencyStatus />
+          </div>
+        </div>
         <div className='tbrowdiv'>
           <div className='tbcelldiv statusHeaderOuter'>
             <div className='statusHeaderMid'>
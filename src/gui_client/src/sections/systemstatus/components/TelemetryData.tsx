@@ -1,5 +1,5 @@
 import { useEffect, useState } from 'react';
-import { TelemetryEntry, useGlobalSession } from '../../../session';
+import { RequestStats, TelemetryEntry, useGlobalSession } from '../../../session';
 import { makeTimeString, timestampToDate } from '../../../utils/format';
 
 import {
@@ -254,3 +254,61 @@ const VoltFullPlot = ({ plotData, show, setShow }: VoltFullPlotProp) => {
     </div>
   );
 };
+
+type RequestRow = {
+  name: string;
+  stats: RequestStats;
+};
+
+export const RequestLatencyStatus = () => {
+  const { telemetryLogs } = useGlobalSession();
+  const [rows, setRows] = useState<RequestRow[]>([]);
+
+  useEffect(() => {
+    if (telemetryLogs.length === 0) {
+      setRows([]);
+      return;
+    }
+    const lastStats = telemetryLogs.slice(-1)[0].tb_request_stats ?? {};
+    setRows(
+      Object.entries(lastStats).flatMap(([client, commands]) =>
+        Object.entries(commands).map(([command, stats]) => {
+          return { name: `${client}/${command}`, stats: stats };
+        }),
+      ),
+    );
+  }, [telemetryLogs]);
+
+  if (rows.length === 0) {
+    return <div>No tileboard requests recorded</div>;
+  }
+
+  return (
+    <table>
+      <thead>
+        <tr>
+          <th>Request</th>
+          <th>Count</th>
+          <th>p50 [ms]</th>
+          <th>p95 [ms]</th>
+          <th>p99 [ms]</th>
+          <th>Sent [B]</th>
+          <th>Received [B]</th>
+        </tr>
+      </thead>
+      <tbody>
+        {rows.map((row) => (
+          <tr key={row.name}>
+            <td>{row.name}</td>
+            <td>{row.stats.count}</td>
+            <td>{tooltipFormatter(row.stats.p50)}</td>
+            <td>{tooltipFormatter(row.stats.p95)}</td>
+            <td>{tooltipFormatter(row.stats.p99)}</td>
+            <td>{row.stats.bytes_sent}</td>
+            <td>{row.stats.bytes_recv}</td>
+          </tr>
+        ))}
+      </tbody>
+    </table>
+  );
+};
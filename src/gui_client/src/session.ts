@@ -54,6 +54,18 @@ export type TelemetryEntry = {
   gmq_pulser_lv: number;
   gmq_pulser_hv: number;
   gantry_coord: [number, number, number];
+  tb_request_stats: { [client: string]: { [command: string]: RequestStats } };
+};
+
+/** Per-command request summary - defined in tbc/tbc.py */
+export type RequestStats = {
+  count: number;
+  p50: number;
+  p95: number;
+  p99: number;
+  max: number;
+  bytes_sent: number;
+  bytes_recv: number;
 };
 
 export type ActionStatus = {